@@ -3,11 +3,16 @@ import os
 import json
 import csv
 import re
-from flask import Flask, request, jsonify, make_response
+import logging
+import threading
+from flask import Flask, Response, request, jsonify, make_response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from functools import wraps
+from werkzeug.http import quote_etag
+from functools import wraps, partial, lru_cache
 from time import time
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
+from bisect import bisect_right
 from loaders import (
     load_weather_sample, load_advisory_sample, load_market_sample, load_soil_sample
 )
@@ -20,15 +25,209 @@ try:
     from dotenv import load_dotenv
     load_dotenv()
 except ImportError:
-    print("python-dotenv not installed. Set environment variables manually.")
-    pass
+    load_dotenv = None
+
+# Per-request details are logged at DEBUG; production runs at INFO and skips them
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+if load_dotenv is None:
+    logger.warning("python-dotenv not installed. Set environment variables manually.")
+
+# AI provider clients are imported once here rather than inside every /advice request
+try:
+    import requests
+except ImportError:
+    requests = None
+try:
+    import openai
+except ImportError:
+    openai = None
+
+_GEMINI_URL = 'https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent'
+_GEMINI_STREAM_URL = 'https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:streamGenerateContent'
+# Matches the gunicorn --threads setting so every worker thread can keep a connection open
+_GEMINI_POOL_SIZE = int(os.getenv('GEMINI_POOL_SIZE', '8'))
+
+def _build_gemini_session():
+    """
+    Build one pooled HTTP session for the Gemini REST API
+    """
+    api_key = os.getenv('GEMINI_API_KEY')
+    if requests is None or not api_key:
+        return None
+    session = requests.Session()
+    session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=_GEMINI_POOL_SIZE))
+    # Sent as a header rather than ?key=, so it never appears in request URLs or error messages
+    session.headers['x-goog-api-key'] = api_key
+    session.headers['Content-Type'] = 'application/json'
+    return session
+
+# Shared by all requests, so keep-alive reuses the TLS connection to Gemini
+_GEMINI_SESSION = _build_gemini_session()
+
+def gemini_generate(session, body, timeout=30):
+    """
+    Call Gemini generateContent with an encoded JSON body and return the text of the first candidate
+    """
+    resp = session.post(_GEMINI_URL, data=body, timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()['candidates'][0]['content']['parts'][0]['text']
+
+def gemini_stream(session, body, timeout=30):
+    """
+    Call Gemini streamGenerateContent over SSE and yield text pieces as they arrive
+    """
+    with session.post(_GEMINI_STREAM_URL, params={'alt': 'sse'}, data=body, timeout=timeout, stream=True) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if not line.startswith(b'data: '):
+                continue
+            candidates = json.loads(line[6:]).get('candidates') or [{}]
+            for part in candidates[0].get('content', {}).get('parts', []):
+                yield part.get('text', '')
+
+if openai:
+    openai.api_key = os.getenv('OPENAI_API_KEY')
+
+# Optional: flask-compress gzip/brotli-encodes the larger JSON responses
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+
+# Optional: orjson encodes JSON several times faster than the stdlib encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional: pyahocorasick lets calculate_confidence match every indicator in one pass
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 def error_response(error, detail, code=400):
     return jsonify({'error': error, 'detail': detail}), code
 
+def dumps_json(obj):
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def count_up_to(text, indicators, cap):
+    """
+    Count how many indicators occur in text, stopping once cap is reached
+    """
+    count = 0
+    for indicator in indicators:
+        if indicator in text:
+            count += 1
+            if count >= cap:
+                break
+    return count
+
+# Indicator lists used by calculate_confidence
+_SPECIFIC_TERMS = [
+    'fertilizer', 'pesticide', 'irrigation', 'seed', 'crop', 'soil', 'weather',
+    'harvest', 'planting', 'disease', 'pest', 'nutrients', 'ph', 'nitrogen',
+    'phosphorus', 'potassium', 'organic', 'compost', 'manure', 'variety'
+]
+_STRUCTURE_INDICATORS = ['**', '*', '1.', '2.', '•', '-', ':']
+_SAFETY_INDICATORS = [
+    'consult', 'expert', 'local', 'test', 'recommend', 'suggest', 'may',
+    'should', 'consider', 'caution', 'careful', 'professional'
+]
+# Common English words, matched as whole tokens of the response
+_ENGLISH_INDICATORS = frozenset(['the', 'and', 'or', 'in', 'on', 'at', 'to', 'for', 'with', 'by'])
+
+# (indicators, cap) per category; only counts up to cap affect the score
+_INDICATOR_CATEGORIES = [
+    (_SPECIFIC_TERMS, 5),
+    (_STRUCTURE_INDICATORS, 3),
+    (_SAFETY_INDICATORS, 3),
+]
+
+# Word tokens: Latin, digits, Arabic script (Urdu) and the Indic blocks from
+# Devanagari to Sinhala, leaving out the danda punctuation marks
+_WORD_RE = re.compile(r'[a-z0-9\u0620-\u065f\u066e-\u06d3\u0900-\u0963\u0966-\u0dff]+')
+
+def _build_indicator_automaton():
+    term_categories = defaultdict(list)
+    for category, (terms, _) in enumerate(_INDICATOR_CATEGORIES):
+        for term in terms:
+            term_categories[term].append(category)
+    automaton = ahocorasick.Automaton()
+    for term, categories in term_categories.items():
+        automaton.add_word(term, (term, tuple(categories)))
+    automaton.make_automaton()
+    return automaton
+
+_INDICATOR_AUTOMATON = _build_indicator_automaton() if ahocorasick else None
+
+_INDICATOR_CAPS = [cap for _, cap in _INDICATOR_CATEGORIES]
+
+def count_indicators(response_lower):
+    """
+    Count distinct indicators per category in the lowercased response, up to each
+    category's cap. The automaton scan stops as soon as every category is capped.
+    """
+    if _INDICATOR_AUTOMATON is None:
+        return [count_up_to(response_lower, terms, cap) for terms, cap in _INDICATOR_CATEGORIES]
+    counts = [0] * len(_INDICATOR_CATEGORIES)
+    uncapped = len(counts)
+    seen = set()
+    for _, (term, categories) in _INDICATOR_AUTOMATON.iter(response_lower):
+        if term in seen:
+            continue
+        seen.add(term)
+        for category in categories:
+            if counts[category] < _INDICATOR_CAPS[category]:
+                counts[category] += 1
+                if counts[category] == _INDICATOR_CAPS[category]:
+                    uncapped -= 1
+        if not uncapped:
+            break
+    return counts
+
+# Score ladders as (sorted thresholds, (bonus, factor) per bucket); a value lands in
+# the bucket of the highest threshold it reaches
+_LENGTH_LADDER = ([51, 101], [
+    (-10, 'Brief response'), (10, 'Adequate detail'), (15, 'Detailed response'),
+])
+_SPECIFICITY_LADDER = ([1, 3, 5], [
+    (-15, 'Limited agricultural specificity'), (5, 'Basic agricultural terms'),
+    (15, 'Good agricultural specificity'), (20, 'High agricultural specificity'),
+])
+_STRUCTURE_LADDER = ([1, 3], [
+    (0, None), (5, 'Some structure'), (10, 'Well-structured response'),
+])
+_RELEVANCE_LADDER = ([0.2, 0.4, 0.7], [
+    (-10, 'Limited relevance to question'), (5, 'Some relevance to question'),
+    (10, 'Good relevance to question'), (15, 'High relevance to question'),
+])
+_SAFETY_LADDER = ([1, 3], [
+    (0, None), (5, 'Some safety awareness'), (10, 'Includes safety considerations'),
+])
+_LEVEL_THRESHOLDS = [40, 55, 70, 80]
+_LEVELS = ['Very Low', 'Low', 'Medium', 'High', 'Very High']
+
+def _ladder_bonus(ladder, value, factors):
+    thresholds, buckets = ladder
+    bonus, factor = buckets[bisect_right(thresholds, value)]
+    if factor:
+        factors.append(factor)
+    return bonus
+
+@lru_cache(maxsize=2048)
 def calculate_confidence(response_text, question, language='english'):
     """
-    Calculate confidence score for Gemini responses based on various factors
+    Calculate confidence score for Gemini responses based on various factors.
+    Results are memoized, so callers must not mutate the returned dict.
     """
     if not response_text or not question:
         return {'score': 30, 'level': 'Low', 'factors': ['Incomplete response']}
@@ -37,92 +236,35 @@ def calculate_confidence(response_text, question, language='english'):
     factors = []
     
     # Length and detail analysis
-    response_length = len(response_text.split())
-    if response_length > 100:
-        confidence_score += 15
-        factors.append('Detailed response')
-    elif response_length > 50:
-        confidence_score += 10
-        factors.append('Adequate detail')
-    else:
-        confidence_score -= 10
-        factors.append('Brief response')
-    
-    # Specificity indicators
-    specific_terms = [
-        'fertilizer', 'pesticide', 'irrigation', 'seed', 'crop', 'soil', 'weather',
-        'harvest', 'planting', 'disease', 'pest', 'nutrients', 'ph', 'nitrogen',
-        'phosphorus', 'potassium', 'organic', 'compost', 'manure', 'variety'
-    ]
+    confidence_score += _ladder_bonus(_LENGTH_LADDER, len(response_text.split()), factors)
     
+    # Specificity, structure and safety indicators in a single scan
     response_lower = response_text.lower()
-    specificity_count = sum(1 for term in specific_terms if term in response_lower)
-    
-    if specificity_count >= 5:
-        confidence_score += 20
-        factors.append('High agricultural specificity')
-    elif specificity_count >= 3:
-        confidence_score += 15
-        factors.append('Good agricultural specificity')
-    elif specificity_count >= 1:
-        confidence_score += 5
-        factors.append('Basic agricultural terms')
-    else:
-        confidence_score -= 15
-        factors.append('Limited agricultural specificity')
+    specificity_count, structure_count, safety_count = count_indicators(response_lower)
+    response_tokens = frozenset(_WORD_RE.findall(response_lower))
     
-    # Structure and formatting
-    structure_indicators = ['**', '*', '1.', '2.', '•', '-', ':']
-    structure_count = sum(1 for indicator in structure_indicators if indicator in response_text)
+    # Specificity indicators
+    confidence_score += _ladder_bonus(_SPECIFICITY_LADDER, specificity_count, factors)
     
-    if structure_count >= 3:
-        confidence_score += 10
-        factors.append('Well-structured response')
-    elif structure_count >= 1:
-        confidence_score += 5
-        factors.append('Some structure')
+    # Structure and formatting
+    confidence_score += _ladder_bonus(_STRUCTURE_LADDER, structure_count, factors)
     
     # Question relevance (basic keyword matching)
-    question_lower = question.lower()
-    question_keywords = [word for word in question_lower.split() if len(word) > 3]
-    keyword_matches = sum(1 for keyword in question_keywords if keyword in response_lower)
+    question_keywords = {word for word in _WORD_RE.findall(question.lower()) if len(word) > 3}
+    keyword_matches = len(question_keywords & response_tokens)
     
     if len(question_keywords) > 0:
         relevance_ratio = keyword_matches / len(question_keywords)
-        if relevance_ratio >= 0.7:
-            confidence_score += 15
-            factors.append('High relevance to question')
-        elif relevance_ratio >= 0.4:
-            confidence_score += 10
-            factors.append('Good relevance to question')
-        elif relevance_ratio >= 0.2:
-            confidence_score += 5
-            factors.append('Some relevance to question')
-        else:
-            confidence_score -= 10
-            factors.append('Limited relevance to question')
+        confidence_score += _ladder_bonus(_RELEVANCE_LADDER, relevance_ratio, factors)
     
     # Safety and cautionary statements
-    safety_indicators = [
-        'consult', 'expert', 'local', 'test', 'recommend', 'suggest', 'may', 
-        'should', 'consider', 'caution', 'careful', 'professional'
-    ]
-    safety_count = sum(1 for indicator in safety_indicators if indicator in response_lower)
-    
-    if safety_count >= 3:
-        confidence_score += 10
-        factors.append('Includes safety considerations')
-    elif safety_count >= 1:
-        confidence_score += 5
-        factors.append('Some safety awareness')
+    confidence_score += _ladder_bonus(_SAFETY_LADDER, safety_count, factors)
     
     # Language consistency
     if language != 'english':
         # For non-English responses, check if response is actually in the requested language
         # This is a simplified check - in production, you'd use language detection
-        english_indicators = ['the', 'and', 'or', 'in', 'on', 'at', 'to', 'for', 'with', 'by']
-        english_count = sum(1 for word in english_indicators if word in response_lower)
-        
+        english_count = len(response_tokens & _ENGLISH_INDICATORS)
         if english_count < 5:  # Likely not in English
             confidence_score += 5
             factors.append('Response in requested language')
@@ -134,16 +276,7 @@ def calculate_confidence(response_text, question, language='english'):
     confidence_score = max(0, min(100, confidence_score))
     
     # Determine confidence level
-    if confidence_score >= 80:
-        level = 'Very High'
-    elif confidence_score >= 70:
-        level = 'High'
-    elif confidence_score >= 55:
-        level = 'Medium'
-    elif confidence_score >= 40:
-        level = 'Low'
-    else:
-        level = 'Very Low'
+    level = _LEVELS[bisect_right(_LEVEL_THRESHOLDS, confidence_score)]
     
     return {
         'score': confidence_score,
@@ -151,119 +284,286 @@ def calculate_confidence(response_text, question, language='english'):
         'factors': factors[:5]  # Limit to top 5 factors
     }
 
+# Emoji mappings for agricultural topics
+_EMOJI_MAPPINGS = {
+    r'\b(crops?|farming|agriculture|agricultural)\b': '🌾',
+    r'\b(seed|seeds|planting|sowing)\b': '🌱',
+    r'\b(harvest|harvesting)\b': '🌽',
+    r'\b(fertilizer|fertilizers|nutrients?)\b': '💊',
+    r'\b(pesticide|pesticides|insecticide|pest control)\b': '🛡️',
+    r'\b(irrigation|water|watering)\b': '💧',
+    r'\b(soil|ground|earth)\b': '🌍',
+    r'\b(weather|climate|temperature|rain|sunshine)\b': '☀️',
+    r'\b(disease|diseases|infection)\b': '🦠',
+    r'\b(growth|growing|development)\b': '📈',
+    r'\b(organic|natural)\b': '🌿',
+    r'\b(market|price|sell|selling)\b': '💰',
+    r'\b(equipment|tools?|machinery)\b': '🔧',
+    r'\b(advice|tip|tips|recommendation)\b': '💡',
+    r'\b(warning|caution|avoid|careful)\b': '⚠️',
+    r'\b(important|crucial|essential)\b': '❗',
+    r'\b(good|excellent|best|optimal)\b': '✅',
+    r'\b(problem|issue|difficulty)\b': '❌'
+}
+
+def _build_emoji_tokens():
+    """
+    Expand the keyword alternations into a {word: emoji} map, plus multi-word
+    phrases keyed by their first word
+    """
+    tokens, phrases = {}, {}
+    for pattern, emoji in _EMOJI_MAPPINGS.items():
+        for keyword in pattern[3:-3].split('|'):
+            variants = [keyword[:-2], keyword[:-1]] if keyword.endswith('?') else [keyword]
+            for variant in variants:
+                head, _, rest = variant.partition(' ')
+                if rest:
+                    phrases[head] = (re.compile(re.escape(' ' + rest) + r'\b', re.IGNORECASE), emoji)
+                else:
+                    tokens[variant] = emoji
+    return tokens, phrases
+
+_EMOJI_TOKEN_MAP, _EMOJI_PHRASES = _build_emoji_tokens()
+_TOKEN_RE = re.compile(r'\b\w+\b')
+
+def _add_topic_emojis(text):
+    """
+    Prefix topic keywords with their emoji in a single scan. A keyword is skipped when
+    that emoji directly precedes it or appears later on the same line.
+    """
+    parts = []
+    last = 0
+    for match in _TOKEN_RE.finditer(text):
+        word = match.group(0).lower()
+        start, end = match.span()
+        emoji = _EMOJI_TOKEN_MAP.get(word)
+        if emoji is None:
+            phrase = _EMOJI_PHRASES.get(word)
+            if phrase is None:
+                continue
+            tail_re, emoji = phrase
+            tail = tail_re.match(text, end)
+            if tail is None:
+                continue
+            end = tail.end()
+        before = text[max(0, start - len(emoji) - 1):start]
+        if before.endswith(emoji) or before == emoji + ' ':
+            continue
+        line_end = text.find('\n', end)
+        if text.find(emoji, end, len(text) if line_end == -1 else line_end) != -1:
+            continue
+        parts.append(text[last:start])
+        parts.append(emoji + ' ')
+        last = start
+    if not parts:
+        return text
+    parts.append(text[last:])
+    return ''.join(parts)
+
+_STRAY_ASTERISK_RE = re.compile(r'(?<!\*)\*(?!\*)(?!\s*\*)')
+
+# Major sections that get a horizontal divider in front of them
+_SECTION_KEYWORDS = (
+    r'(?:Key Points?|Main Points?|Important|Summary|In Summary|Conclusion|Recommendations?|Advice|Tips?|Steps?|Process|Method|Procedure|'
+    r'What to Do|How to|When to|Where to|Why|Benefits?|Advantages?|Disadvantages?|Pros?|Cons?|'
+    r'Materials? Needed|Requirements?|Equipment|Tools? Required|Supplies?|'
+    r'Timing|Schedule|Calendar|Season|Month|Week|'
+    r'Cost|Price|Budget|Economics?|'
+    r'Avoid|Don\'t|Never|Warning|Caution|Risk|'
+    r'Sustainable|Organic|Natural|Environmental)'
+)
+# Section headers that get an emoji, keyed on the header keyword without its plural 's'
+_HEADER_KEYWORDS = r'(Key Points?|Summary|Recommendations?|Steps?|Materials?|Timing|Benefits?|Avoid|Warning)'
+_HEADER_EMOJI = {
+    'key point': '📋',
+    'summary': '📝',
+    'recommendation': '💡',
+    'step': '📋',
+    'material': '🛠️',
+    'timing': '⏰',
+    'benefit': '✅',
+    'avoid': '⚠️',
+    'warning': '⚠️',
+}
+
+# Any bold span opening with either kind of keyword; the callback decides what it gets
+_SECTION_HEADER_RE = re.compile(rf'\*\*(?:{_SECTION_KEYWORDS}|{_HEADER_KEYWORDS}).*?\*\*', re.IGNORECASE)
+_SECTION_KEYWORD_RE = re.compile(_SECTION_KEYWORDS, re.IGNORECASE)
+_HEADER_KEYWORD_RE = re.compile(_HEADER_KEYWORDS, re.IGNORECASE)
+
+def _decorate_section(match):
+    span = match.group(0)
+    header = _HEADER_KEYWORD_RE.match(span, 2)
+    if header:
+        span = f"{_HEADER_EMOJI[header.group(1).lower().rstrip('s')]} {span}"
+    if _SECTION_KEYWORD_RE.match(match.group(0), 2):
+        span = '\n\n---\n\n' + span
+    return span
+
+_BOLD_NUMBER_RE = re.compile(r'(\*\*\d+\.)')
+_NUMBERED_ITEM_RE = re.compile(r'(?<!\n)(\d+\.(?!\d))')
+_BOLD_BULLET_RE = re.compile(r'(\* \*\*)')
+_INLINE_BULLET_RE = re.compile(r'((?<!\n)\* )')
+_LINE_BULLET_RE = re.compile(r'^(\* )', re.MULTILINE)
+_BOLD_COLON_RE = re.compile(r'(\*\*.*?:\*\*)')
+_SECTION_END_RE = re.compile(r'(\.) (\*\*[A-Z])')
+_EXTRA_NEWLINES_RE = re.compile(r'\n{3,}')
+_SENTENCE_BREAK_RE = re.compile(r'([a-z]\.)(?: )([A-Z][^*])')
+_CONCLUSION_WORDS_RE = re.compile(r'(in conclusion|finally|to summarize|overall|remember)', re.IGNORECASE)
+_CONCLUSION_LINE_RE = re.compile(r'(.*?(?:in conclusion|finally|to summarize|overall|remember).*)', re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
 def format_gemini_response(text):
     """
-    Format Gemini response text for better readability in chat interface with emojis and proper structure
+    Format Gemini response text for better readability in chat interface with emojis and proper structure.
+    Results are memoized on the input text, which also covers repeated sample responses.
     """
     if not text:
         return text
     
-    import re
-    
     # Clean up the text
     formatted = text.strip()
     
-    # Add emoji mappings for agricultural topics
-    emoji_mappings = {
-        r'\b(crops?|farming|agriculture|agricultural)\b': '🌾',
-        r'\b(seed|seeds|planting|sowing)\b': '🌱',
-        r'\b(harvest|harvesting)\b': '🌽',
-        r'\b(fertilizer|fertilizers|nutrients?)\b': '💊',
-        r'\b(pesticide|pesticides|insecticide|pest control)\b': '🛡️',
-        r'\b(irrigation|water|watering)\b': '💧',
-        r'\b(soil|ground|earth)\b': '🌍',
-        r'\b(weather|climate|temperature|rain|sunshine)\b': '☀️',
-        r'\b(disease|diseases|infection)\b': '🦠',
-        r'\b(growth|growing|development)\b': '📈',
-        r'\b(organic|natural)\b': '🌿',
-        r'\b(market|price|sell|selling)\b': '💰',
-        r'\b(equipment|tools?|machinery)\b': '🔧',
-        r'\b(advice|tip|tips|recommendation)\b': '💡',
-        r'\b(warning|caution|avoid|careful)\b': '⚠️',
-        r'\b(important|crucial|essential)\b': '❗',
-        r'\b(good|excellent|best|optimal)\b': '✅',
-        r'\b(problem|issue|difficulty)\b': '❌'
-    }
-    
     # Apply emoji mappings (case insensitive)
-    for pattern, emoji in emoji_mappings.items():
-        # Only add emoji if the word doesn't already have an emoji nearby
-        formatted = re.sub(f'(?<!{emoji} )(?<!{emoji}){pattern}(?!.*{emoji})', f'{emoji} \\g<0>', formatted, flags=re.IGNORECASE)
-    
-    # Convert **bold text** to proper HTML-like formatting for frontend
-    formatted = re.sub(r'\*\*(.*?)\*\*', r'**\1**', formatted)
+    formatted = _add_topic_emojis(formatted)
     
     # Clean up standalone asterisks that aren't part of formatting
-    formatted = re.sub(r'(?<!\*)\*(?!\*)(?!\s*\*)', '', formatted)
-    
-    # Add horizontal dividers and section formatting
-    # Add divider before major sections
-    major_sections = [
-        r'(\*\*(?:Key Points?|Main Points?|Important|Summary|In Summary|Conclusion|Recommendations?|Advice|Tips?|Steps?|Process|Method|Procedure).*?\*\*)',
-        r'(\*\*(?:What to Do|How to|When to|Where to|Why|Benefits?|Advantages?|Disadvantages?|Pros?|Cons?).*?\*\*)',
-        r'(\*\*(?:Materials? Needed|Requirements?|Equipment|Tools? Required|Supplies?).*?\*\*)',
-        r'(\*\*(?:Timing|Schedule|Calendar|Season|Month|Week).*?\*\*)',
-        r'(\*\*(?:Cost|Price|Budget|Economics?).*?\*\*)',
-        r'(\*\*(?:Avoid|Don\'t|Never|Warning|Caution|Risk).*?\*\*)',
-        r'(\*\*(?:Sustainable|Organic|Natural|Environmental).*?\*\*)'
-    ]
-    
-    for section_pattern in major_sections:
-        formatted = re.sub(section_pattern, r'\n\n---\n\n\1', formatted, flags=re.IGNORECASE)
-    
-    # Add section headers with emojis
-    formatted = re.sub(r'\*\*(Key Points?.*?)\*\*', r'📋 **\1**', formatted, flags=re.IGNORECASE)
-    formatted = re.sub(r'\*\*(Summary.*?)\*\*', r'📝 **\1**', formatted, flags=re.IGNORECASE)
-    formatted = re.sub(r'\*\*(Recommendations?.*?)\*\*', r'💡 **\1**', formatted, flags=re.IGNORECASE)
-    formatted = re.sub(r'\*\*(Steps?.*?)\*\*', r'📋 **\1**', formatted, flags=re.IGNORECASE)
-    formatted = re.sub(r'\*\*(Materials?.*?)\*\*', r'🛠️ **\1**', formatted, flags=re.IGNORECASE)
-    formatted = re.sub(r'\*\*(Timing.*?)\*\*', r'⏰ **\1**', formatted, flags=re.IGNORECASE)
-    formatted = re.sub(r'\*\*(Benefits?.*?)\*\*', r'✅ **\1**', formatted, flags=re.IGNORECASE)
-    formatted = re.sub(r'\*\*(Avoid.*?|Warning.*?)\*\*', r'⚠️ **\1**', formatted, flags=re.IGNORECASE)
+    formatted = _STRAY_ASTERISK_RE.sub('', formatted)
+    
+    # Add a divider before major sections and an emoji before known section headers
+    formatted = _SECTION_HEADER_RE.sub(_decorate_section, formatted)
     
     # Add line breaks before numbered sections
-    formatted = re.sub(r'(\*\*\d+\.)', r'\n\n\1', formatted)
-    formatted = re.sub(r'(?<!\n)(\d+\.(?!\d))', r'\n• \1', formatted)  # Convert numbered lists to bullet points with emoji
+    formatted = _BOLD_NUMBER_RE.sub(r'\n\n\1', formatted)
+    formatted = _NUMBERED_ITEM_RE.sub(r'\n• \1', formatted)  # Convert numbered lists to bullet points with emoji
     
     # Enhance bullet points
-    formatted = re.sub(r'(\* \*\*)', r'\n\n\1', formatted)
-    formatted = re.sub(r'((?<!\n)\* )', r'\n• ', formatted)  # Convert * to bullet emoji
-    formatted = re.sub(r'^(\* )', r'• ', formatted, flags=re.MULTILINE)  # Convert line-starting * to bullet emoji
+    formatted = _BOLD_BULLET_RE.sub(r'\n\n\1', formatted)
+    formatted = _INLINE_BULLET_RE.sub(r'\n• ', formatted)  # Convert * to bullet emoji
+    formatted = _LINE_BULLET_RE.sub(r'• ', formatted)  # Convert line-starting * to bullet emoji
     
     # Add line breaks after colons when they introduce lists or sections
-    formatted = re.sub(r'(\*\*.*?:\*\*)', r'\1\n', formatted)
+    formatted = _BOLD_COLON_RE.sub(r'\1\n', formatted)
     
     # Ensure proper paragraph breaks after sentences that end sections
-    formatted = re.sub(r'(\.) (\*\*[A-Z])', r'\1\n\n\2', formatted)
+    formatted = _SECTION_END_RE.sub(r'\1\n\n\2', formatted)
     
     # Clean up multiple consecutive line breaks
-    formatted = re.sub(r'\n{3,}', '\n\n', formatted)
+    formatted = _EXTRA_NEWLINES_RE.sub('\n\n', formatted)
     
     # Add spacing before important sections that start with capital letters
-    formatted = re.sub(r'([a-z]\.)(?: )([A-Z][^*])', r'\1\n\n\2', formatted)
+    formatted = _SENTENCE_BREAK_RE.sub(r'\1\n\n\2', formatted)
     
     # Add conclusion divider if there's a concluding paragraph
-    if re.search(r'(in conclusion|finally|to summarize|overall|remember)', formatted, re.IGNORECASE):
-        formatted = re.sub(r'(.*?(?:in conclusion|finally|to summarize|overall|remember).*)', r'\n\n---\n\n🎯 \1', formatted, flags=re.IGNORECASE)
+    if _CONCLUSION_WORDS_RE.search(formatted):
+        formatted = _CONCLUSION_LINE_RE.sub(r'\n\n---\n\n🎯 \1', formatted)
     
     return formatted.strip()
 
-def rate_limiter(max_per_minute=30):
-    calls = defaultdict(list)
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson; types orjson can't encode go through Flask's default hook
+    """
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default), mimetype=self.mimetype)
+
+# Guards every rate limiter's windows; gunicorn runs several threads per worker
+_RATE_LIMIT_LOCK = threading.Lock()
+
+def over_rate_limit(calls, max_per_minute, max_tracked_ips=10000):
+    """
+    Record a request from the current client in its sliding window and report
+    whether it went over the per-minute limit
+    """
+    ip = request.remote_addr
+    now = time()
+    cutoff = now - 60
+    with _RATE_LIMIT_LOCK:
+        # Re-inserting keeps calls ordered by last activity, least recent first
+        window = calls.pop(ip, None) or deque()
+        calls[ip] = window
+        while window and window[0] <= cutoff:
+            window.popleft()
+        if len(window) >= max_per_minute:
+            return True
+        window.append(now)
+        # Forget idle IPs from the front once too many are tracked, so memory
+        # stays bounded without scanning every tracked IP
+        while len(calls) > max_tracked_ips:
+            oldest_ip = next(iter(calls))
+            if calls[oldest_ip] and calls[oldest_ip][-1] > cutoff:
+                break
+            del calls[oldest_ip]
+    return False
+
+def rate_limiter(max_per_minute=30, max_tracked_ips=10000):
+    # Sliding window of request times per IP, oldest first
+    calls = defaultdict(deque)
     def decorator(f):
         @wraps(f)
         def wrapped(*args, **kwargs):
-            ip = request.remote_addr
-            now = time()
-            calls[ip] = [t for t in calls[ip] if now-t < 60]
-            if len(calls[ip]) >= max_per_minute:
+            if over_rate_limit(calls, max_per_minute, max_tracked_ips):
                 return error_response('rate_limited', 'Too many requests', 429)
-            calls[ip].append(now)
             return f(*args, **kwargs)
         return wrapped
     return decorator
 
+def is_trivial_question(question):
+    """
+    Detect empty, numeric-only or repeated-character questions not worth an LLM call
+    """
+    stripped = question.strip()
+    return len(stripped) < 5 or stripped.isdigit() or len(set(stripped)) < 3
+
+# Answers recently given per (ip, question, language), so repeated submissions
+# within the window are served again without another LLM round trip
+DUPLICATE_WINDOW = 30  # seconds
+# Oldest first, so expired entries are evicted from the front
+_recent_answers = OrderedDict()
+_RECENT_ANSWERS_LOCK = threading.Lock()
+_MAX_RECENT_ANSWERS = 10000
+
+def recent_answer(ip, question, language):
+    entry = _recent_answers.get((ip, question, language))
+    if entry and time() - entry[0] < DUPLICATE_WINDOW:
+        return entry[1]
+    return None
+
+def remember_answer(ip, question, language, payload):
+    now = time()
+    key = (ip, question, language)
+    with _RECENT_ANSWERS_LOCK:
+        _recent_answers[key] = (now, payload)
+        _recent_answers.move_to_end(key)
+        # Drop expired entries, and the oldest live ones beyond the size cap
+        while _recent_answers:
+            t, _ = next(iter(_recent_answers.values()))
+            if now - t < DUPLICATE_WINDOW and len(_recent_answers) <= _MAX_RECENT_ANSWERS:
+                break
+            _recent_answers.popitem(last=False)
+
 app = Flask(__name__)
+if orjson:
+    app.json = OrjsonProvider(app)
+
+# Compress JSON responses above 500 bytes, preferring brotli over gzip
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 500
+# Compressing streamed responses would buffer /advice/stream events
+app.config['COMPRESS_STREAMS'] = False
+if Compress:
+    Compress(app)
+else:
+    logger.info("flask-compress not installed. Responses will be sent uncompressed.")
+# ETag suffixes flask-compress appends to compressed responses
+_ETAG_SUFFIXES = ('',) + tuple(':' + algorithm for algorithm in app.config['COMPRESS_ALGORITHM'])
 
 # Configure CORS for both development and production
 allowed_origins = [
@@ -315,37 +615,109 @@ else:
     # Local development: data is in ../data
     DATA_DIR = os.path.join(os.path.dirname(__file__), '../data')
 
-print(f"Using data directory: {DATA_DIR}")
-DATA = {}
-DATA_MTIME = {}
-DATA_ETAG = {}
+logger.info("Using data directory: %s", DATA_DIR)
+# Bumped on every data (re)load so cached responses built from older data are never served
+DATA_GENERATION = 0
 
-def refresh_data():
-    try:
-        DATA['weather'], DATA_MTIME['weather'], DATA_ETAG['weather'] = load_weather_sample(DATA_DIR)
-    except FileNotFoundError:
-        print("Warning: weather.json not found, using empty data")
-        DATA['weather'], DATA_MTIME['weather'], DATA_ETAG['weather'] = {}, 0, ""
-    
-    try:
-        DATA['advisories'], DATA_MTIME['advisories'], DATA_ETAG['advisories'] = load_advisory_sample(DATA_DIR)
-    except FileNotFoundError:
-        print("Warning: advisories.json not found, using empty data")
-        DATA['advisories'], DATA_MTIME['advisories'], DATA_ETAG['advisories'] = {}, 0, ""
-    
+class DataSlot:
+    """
+    Everything loaded for one data type: its rows, lookup index and cache validators
+    """
+    __slots__ = ('rows', 'idx', 'mtime', 'etag', 'headers', 'file_mtime')
+
+    def __init__(self):
+        self.rows = {}
+        self.idx = {}
+        self.mtime = 0
+        self.etag = ""
+        self.headers = {}
+        # os.stat mtime of the source file when it was loaded (None if it was missing)
+        self.file_mtime = None
+
+# Filled lazily by maybe_refresh(); a reload swaps in a complete new slot
+DATA_SLOTS = {}
+
+def index_rows(rows, key):
+    index = defaultdict(list)
+    for row in rows:
+        index[key(row)].append(row)
+    return dict(index)
+
+# Source file and loader for each data type
+_DATA_FILES = {
+    'weather': ('weather.json', load_weather_sample),
+    'advisories': ('advisories.json', load_advisory_sample),
+    'market': ('market.json', load_market_sample),
+    'soil': ('soil.json', load_soil_sample),
+}
+# Key each data endpoint looks rows up by
+_INDEX_KEYS = {
+    'weather': lambda w: w.get('district'),
+    'advisories': lambda a: (a.get('district'), a.get('crop')),
+    'market': lambda m: (m.get('crop'), m.get('market')),
+}
+
+def _build_index(data_type, rows):
+    """
+    Secondary index for one data type, so the data endpoints do a dict lookup
+    instead of a full scan
+    """
+    key = _INDEX_KEYS.get(data_type)
+    if key is None:
+        return {}
+    index = index_rows(rows, key)
+    if data_type == 'market':
+        # Market rows are also sorted by date once here, so /market only has to
+        # slice the last `days` rows per request
+        index = {k: sorted(v, key=lambda x: x.get('date', '')) for k, v in index.items()}
+    return index
+
+def maybe_refresh(data_type, force=False):
+    """
+    Load one data type on first use, and reload it only when its file's mtime changes
+    """
+    global DATA_GENERATION
+    filename, loader = _DATA_FILES[data_type]
     try:
-        DATA['market'], DATA_MTIME['market'], DATA_ETAG['market'] = load_market_sample(DATA_DIR)
+        file_mtime = os.stat(os.path.join(DATA_DIR, filename)).st_mtime
     except FileNotFoundError:
-        print("Warning: market.json not found, using empty data")
-        DATA['market'], DATA_MTIME['market'], DATA_ETAG['market'] = {}, 0, ""
+        file_mtime = None
+    current = DATA_SLOTS.get(data_type)
+    if not force and current is not None and current.file_mtime == file_mtime:
+        return
     
+    slot = DataSlot()
     try:
-        DATA['soil'], DATA_MTIME['soil'], DATA_ETAG['soil'] = load_soil_sample(DATA_DIR)
+        slot.rows, slot.mtime, slot.etag = loader(DATA_DIR)
     except FileNotFoundError:
-        print("Warning: soil.json not found, using empty data")
-        DATA['soil'], DATA_MTIME['soil'], DATA_ETAG['soil'] = {}, 0, ""
+        logger.warning("%s not found, using empty data", filename)
+    slot.idx = _build_index(data_type, slot.rows)
+    slot.headers = {'ETag': quote_etag(slot.etag) if slot.etag else '', 'Last-Modified': slot.mtime}
+    slot.file_mtime = file_mtime
+    DATA_SLOTS[data_type] = slot
+    DATA_GENERATION += 1
+
+def refresh_data():
+    """
+    Force a reload of every data type
+    """
+    for data_type in _DATA_FILES:
+        maybe_refresh(data_type, force=True)
+
+@lru_cache(maxsize=512)
+def cached_json(data_type, key, generation, days=None):
+    """
+    JSON-encoded rows for one index lookup, optionally limited to the last `days` rows.
+    generation is part of the cache key, so entries from before a refresh are never reused.
+    """
+    slot = DATA_SLOTS.get(data_type)
+    rows = slot.idx.get(key, []) if slot else []
+    if days is not None:
+        rows = rows[-days:]
+    return dumps_json(rows)
 
-refresh_data()
+def json_bytes_response(body):
+    return app.response_class(body, mimetype='application/json')
 
 @app.route('/health')
 def health():
@@ -367,57 +739,84 @@ def test():
     })
 
 
-def cache_headers(data_type):
+def not_modified(data_type):
+    """
+    True when the client's conditional headers match the loaded data
+    """
+    slot = DATA_SLOTS.get(data_type)
+    if slot is None:
+        return False
+    # flask-compress rewrites the ETag of compressed responses to "<etag>:<algorithm>",
+    # so clients revalidate with whichever form they were served
+    if slot.etag and any(request.if_none_match.contains_weak(slot.etag + suffix)
+                         for suffix in _ETAG_SUFFIXES):
+        return True
+    return request.headers.get('If-Modified-Since') == slot.mtime
+
+# Data endpoints whose whole response is described by one data type's ETag
+_ETAG_ROUTES = {'/weather': 'weather', '/market': 'market', '/advisories': 'advisories'}
+
+@app.before_request
+def etag_shortcut():
+    """
+    Answer unchanged conditional GETs before rate limiting and the view run
+    """
+    data_type = _ETAG_ROUTES.get(request.path)
+    if data_type is None or request.method not in ('GET', 'HEAD'):
+        return None
+    maybe_refresh(data_type)
+    if not_modified(data_type):
+        return app.response_class(status=304, headers=DATA_SLOTS[data_type].headers)
+
+def cached_rate_limited(data_type, max_per_minute=30):
+    """
+    Rate limiting and cache headers for a data endpoint, in a single wrapper
+    """
+    calls = defaultdict(deque)
     def decorator(f):
         @wraps(f)
         def wrapped(*args, **kwargs):
-            etag = DATA_ETAG.get(data_type)
-            last_modified = DATA_MTIME.get(data_type)
-            if_none_match = request.headers.get('If-None-Match')
-            if_modified_since = request.headers.get('If-Modified-Since')
-            if if_none_match == etag or if_modified_since == last_modified:
-                return '', 304
+            # etag_shortcut() has already refreshed the slot and answered 304s
+            slot = DATA_SLOTS[data_type]
+            if over_rate_limit(calls, max_per_minute):
+                return error_response('rate_limited', 'Too many requests', 429)
             resp = f(*args, **kwargs)
             if isinstance(resp, (list, dict)):
-                resp = make_response(jsonify(resp))
-            resp.headers['ETag'] = etag
-            resp.headers['Last-Modified'] = last_modified
+                resp = jsonify(resp)
+            # Error tuples from error_response() become real responses, without cache headers
+            resp = make_response(resp)
+            if resp.status_code == 200:
+                resp.headers.update(slot.headers)
             return resp
         return wrapped
     return decorator
 
 @app.route('/weather')
-@rate_limiter()
-@cache_headers('weather')
+@cached_rate_limited('weather')
 def weather():
     district = request.args.get('district')
-    weather = DATA.get('weather', [])
     if not district:
         return error_response('missing_param', 'district required')
-    filtered = [w for w in weather if w.get('district') == district]
-    return filtered
+    return json_bytes_response(cached_json('weather', district, DATA_GENERATION))
 
 
 @app.route('/market')
-@rate_limiter()
-@cache_headers('market')
+@cached_rate_limited('market')
 def market():
     crop = request.args.get('crop')
     market = request.args.get('market')
     days = int(request.args.get('days', 7))
-    market_data = DATA.get('market', [])
     if not crop or not market:
         return error_response('missing_param', 'crop and market required')
-    filtered = [m for m in market_data if m.get('crop') == crop and m.get('market') == market]
-    filtered = sorted(filtered, key=lambda x: x.get('date', ''))[-days:]
-    return filtered
+    return json_bytes_response(cached_json('market', (crop, market), DATA_GENERATION, days))
 
 
 @app.route('/calendar')
 @rate_limiter()
 def calendar():
     district = request.args.get('district')
-    calendar = DATA.get('calendar.sample.json', [])
+    slot = DATA_SLOTS.get('calendar')
+    calendar = slot.rows if slot else []
     if not district:
         return error_response('missing_param', 'district required')
     filtered = [c for c in calendar if c.get('district') == district]
@@ -425,65 +824,22 @@ def calendar():
 
 
 @app.route('/advisories')
-@rate_limiter()
-@cache_headers('advisories')
+@cached_rate_limited('advisories')
 def advisories():
     district = request.args.get('district')
     crop = request.args.get('crop')
-    advisories = DATA.get('advisories', [])
     if not district or not crop:
         return error_response('missing_param', 'district and crop required')
-    filtered = [a for a in advisories if a.get('district') == district and a.get('crop') == crop]
-    return filtered
+    return json_bytes_response(cached_json('advisories', (district, crop), DATA_GENERATION))
 
-@app.route('/advice', methods=['POST'])
-@rate_limiter()
-def advice():
-    try:
-        data = request.get_json(force=True)
-        question = data.get('question') or data.get('text')  # Support both 'question' and 'text'
-        language = data.get('language', 'english')  # Get language preference
-        preferred_language = data.get('preferredLanguage', 'en-US')  # Get language code
-        
-        if not question:
-            return error_response('missing_param', 'question or text required')
-        
-        print(f"Question: {question}")
-        print(f"Language: {language}")
-        print(f"Preferred Language Code: {preferred_language}")
-        
-        # Check for Gemini API key first, then OpenAI
-        gemini_api_key = os.getenv('GEMINI_API_KEY')
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        
-        print(f"Gemini API Key available: {bool(gemini_api_key)}")
-        print(f"OpenAI API Key available: {bool(openai_api_key)}")
-        
-        if not gemini_api_key and not openai_api_key:
-            return error_response('api_key_missing', 'Neither GEMINI_API_KEY nor OPENAI_API_KEY is configured'), 500
-        
-        if gemini_api_key:
-            try:
-                print("Attempting to use Gemini API...")
-                # Use Google Gemini API
-                import google.generativeai as genai
-                
-                print("Gemini API imported successfully")
-                
-                # Configure Gemini
-                genai.configure(api_key=gemini_api_key)
-                model = genai.GenerativeModel('gemini-1.5-flash')  # Updated model name
-                
-                print("Gemini model configured")
-                
-                # Language-specific system prompts for Gemini
-                system_prompts = {
-                    'hindi': f"आप एक कृषि विशेषज्ञ हैं। किसानों को हिंदी में सटीक और व्यावहारिक सलाह दें। कृपया अपना उत्तर इस तरह व्यवस्थित करें:\n- मुख्य बिंदुओं को **बोल्ड** में लिखें\n- सूची और बुलेट पॉइंट का उपयोग करें\n- अलग-अलग सेक्शन बनाएं\n- महत्वपूर्ण सुझावों के लिए इमोजी का उपयोग करें\n- स्पष्ट शीर्षक दें\n\nप्रश्न: {question}",
-                    'bengali': f"আপনি একজন কৃষি বিশেষজ্ঞ। কৃষকদের বাংলায় সঠিক এবং ব্যবহারিক পরামর্শ দিন। দয়া করে আপনার উত্তর এভাবে সংগঠিত করুন:\n- মূল পয়েন্টগুলি **বোল্ড** করুন\n- তালিকা এবং বুলেট পয়েন্ট ব্যবহার করুন\n- বিভিন্ন বিভাগ তৈরি করুন\n- গুরুত্বপূর্ণ পরামর্শের জন্য ইমোজি ব্যবহার করুন\n- স্পষ্ট শিরোনাম দিন\n\nপ্রশ্ন: {question}",
-                    'gujarati': f"તમે એક કૃષિ નિષ્ણાત છો। ખેડૂતોને ગુજરાતીમાં સચોટ અને વ્યવહારિક સલાહ આપો। કૃપા કરીને તમારા જવાબને આ રીતે ગોઠવો:\n- મુખ્ય મુદ્દાઓને **બોલ્ડ** કરો\n- સૂચિ અને બુલેટ પોઇન્ટનો ઉપયોગ કરો\n- વિવિધ વિભાગો બનાવો\n- મહત્વપૂર્ણ સૂચનાઓ માટે ઇમોજીનો ઉપયોગ કરો\n- સ્પષ્ટ શીર્ષકો આપો\n\nપ્રશ્ન: {question}",
-                    'punjabi': f"ਤੁਸੀਂ ਇੱਕ ਖੇਤੀਬਾੜੀ ਮਾਹਰ ਹੋ। ਕਿਸਾਨਾਂ ਨੂੰ ਪੰਜਾਬੀ ਵਿੱਚ ਸਟੀਕ ਅਤੇ ਵਿਹਾਰਕ ਸਲਾਹ ਦਿਓ। ਕਿਰਪਾ ਕਰਕੇ ਆਪਣੇ ਜਵਾਬ ਨੂੰ ਇਸ ਤਰ੍ਹਾਂ ਸੰਗਠਿਤ ਕਰੋ:\n- ਮੁੱਖ ਨੁਕਤਿਆਂ ਨੂੰ **ਬੋਲਡ** ਕਰੋ\n- ਸੂਚੀਆਂ ਅਤੇ ਬੁਲੇਟ ਪੁਆਇੰਟਾਂ ਦੀ ਵਰਤੋਂ ਕਰੋ\n- ਵੱਖ-ਵੱਖ ਭਾਗ ਬਣਾਓ\n- ਮਹੱਤਵਪੂਰਨ ਸੁਝਾਵਾਂ ਲਈ ਇਮੋਜੀ ਦੀ ਵਰਤੋਂ ਕਰੋ\n- ਸਪਸ਼ਟ ਸਿਰਲੇਖ ਦਿਓ\n\nਸਵਾਲ: {question}",
-                    'arabic': f"أنت خبير زراعي. قدم نصائح دقيقة وعملية للمزارعين باللغة العربية। يرجى تنظيم إجابتك بهذا الشكل:\n- اجعل النقاط الرئيسية **عريضة**\n- استخدم القوائم والنقاط النقطية\n- أنشئ أقساماً مختلفة\n- استخدم الرموز التعبيرية للنصائح المهمة\n- أعط عناوين واضحة\n\nالسؤال: {question}",
-                    'english': f"""You are an agricultural expert. Provide accurate and practical advice to farmers in English. 
+# Language-specific system prompts for Gemini; the question is appended at the end
+_GEMINI_PROMPT_PREFIXES = {
+    'hindi': "आप एक कृषि विशेषज्ञ हैं। किसानों को हिंदी में सटीक और व्यावहारिक सलाह दें। कृपया अपना उत्तर इस तरह व्यवस्थित करें:\n- मुख्य बिंदुओं को **बोल्ड** में लिखें\n- सूची और बुलेट पॉइंट का उपयोग करें\n- अलग-अलग सेक्शन बनाएं\n- महत्वपूर्ण सुझावों के लिए इमोजी का उपयोग करें\n- स्पष्ट शीर्षक दें\n\nप्रश्न: ",
+    'bengali': "আপনি একজন কৃষি বিশেষজ্ঞ। কৃষকদের বাংলায় সঠিক এবং ব্যবহারিক পরামর্শ দিন। দয়া করে আপনার উত্তর এভাবে সংগঠিত করুন:\n- মূল পয়েন্টগুলি **বোল্ড** করুন\n- তালিকা এবং বুলেট পয়েন্ট ব্যবহার করুন\n- বিভিন্ন বিভাগ তৈরি করুন\n- গুরুত্বপূর্ণ পরামর্শের জন্য ইমোজি ব্যবহার করুন\n- স্পষ্ট শিরোনাম দিন\n\nপ্রশ্ন: ",
+    'gujarati': "તમે એક કૃષિ નિષ્ણાત છો। ખેડૂતોને ગુજરાતીમાં સચોટ અને વ્યવહારિક સલાહ આપો। કૃપા કરીને તમારા જવાબને આ રીતે ગોઠવો:\n- મુખ્ય મુદ્દાઓને **બોલ્ડ** કરો\n- સૂચિ અને બુલેટ પોઇન્ટનો ઉપયોગ કરો\n- વિવિધ વિભાગો બનાવો\n- મહત્વપૂર્ણ સૂચનાઓ માટે ઇમોજીનો ઉપયોગ કરો\n- સ્પષ્ટ શીર્ષકો આપો\n\nપ્રશ્ન: ",
+    'punjabi': "ਤੁਸੀਂ ਇੱਕ ਖੇਤੀਬਾੜੀ ਮਾਹਰ ਹੋ। ਕਿਸਾਨਾਂ ਨੂੰ ਪੰਜਾਬੀ ਵਿੱਚ ਸਟੀਕ ਅਤੇ ਵਿਹਾਰਕ ਸਲਾਹ ਦਿਓ। ਕਿਰਪਾ ਕਰਕੇ ਆਪਣੇ ਜਵਾਬ ਨੂੰ ਇਸ ਤਰ੍ਹਾਂ ਸੰਗਠਿਤ ਕਰੋ:\n- ਮੁੱਖ ਨੁਕਤਿਆਂ ਨੂੰ **ਬੋਲਡ** ਕਰੋ\n- ਸੂਚੀਆਂ ਅਤੇ ਬੁਲੇਟ ਪੁਆਇੰਟਾਂ ਦੀ ਵਰਤੋਂ ਕਰੋ\n- ਵੱਖ-ਵੱਖ ਭਾਗ ਬਣਾਓ\n- ਮਹੱਤਵਪੂਰਨ ਸੁਝਾਵਾਂ ਲਈ ਇਮੋਜੀ ਦੀ ਵਰਤੋਂ ਕਰੋ\n- ਸਪਸ਼ਟ ਸਿਰਲੇਖ ਦਿਓ\n\nਸਵਾਲ: ",
+    'arabic': "أنت خبير زراعي. قدم نصائح دقيقة وعملية للمزارعين باللغة العربية। يرجى تنظيم إجابتك بهذا الشكل:\n- اجعل النقاط الرئيسية **عريضة**\n- استخدم القوائم والنقاط النقطية\n- أنشئ أقساماً مختلفة\n- استخدم الرموز التعبيرية للنصائح المهمة\n- أعط عناوين واضحة\n\nالسؤال: ",
+    'english': """You are an agricultural expert. Provide accurate and practical advice to farmers in English. 
 
 Please structure your response with:
 - Use **bold** for main headings and important points
@@ -495,146 +851,92 @@ Please structure your response with:
 
 Make your response visually appealing and easy to scan. Use formatting to help farmers quickly find the information they need.
 
-Question: {question}""",
-                    'telugu': f"మీరు వ్యవసాయ నిపుణుడు. రైతులకు తెలుగులో ఖచ్చితమైన మరియు ఆచరణీయమైన సలహలు ఇవ్వండి. దయచేసి మీ సమాధానాన్ని ఈ విధంగా నిర్వహించండి:\n- ముఖ్య అంశాలను **బోల్డ్** లో రాయండి\n- జాబితాలు మరియు బుల్లెట్ పాయింట్లను వాడండి\n- వేర్వేరు విభాగాలను సృష్టించండి\n- ముఖ్యమైన సూచనల కోసం ఇమోజీలను వాడండి\n- స్పష్టమైన శీర్షికలు ఇవ్వండి\n\nప్రశ్న: {question}",
-                    'tamil': f"நீங்கள் ஒரு விவசாய நிபுணர். விவசாயிகளுக்கு தமிழில் துல்லியமான மற்றும் நடைமுறை ஆலோசனைகளை வழங்கவும். உங்கள் பதிலை இந்த வகையில் அமைக்கவும்:\n- முக்கிய புள்ளிகளை **தடிமனாக** எழுதவும்\n- பட்டியல்கள் மற்றும் புள்ளி குறிகளைப் பயன்படுத்தவும்\n- வெவ்வேறு பிரிவுகளை உருவாக்கவும்\n- முக்கியமான ஆலோசனைகளுக்கு இமோஜிகளைப் பயன்படுத்தவும்\n- தெளிவான தலைப்புகளைக் கொடுக்கவும்\n\nகேள்வி: {question}",
-                    'marathi': f"तुम्ही एक कृषी तज्ञ आहात. शेतकऱ्यांना मराठीत अचूक आणि व्यावहारिक सल्ला द्या. कृपया तुमचे उत्तर या पद्धतीने मांडा:\n- मुख्य मुद्दे **ठळक** अक्षरात लिहा\n- यादी आणि बुलेट पॉइंट्स वापरा\n- वेगवेगळे विभाग तयार करा\n- महत्त्वाच्या सूचनांसाठी इमोजी वापरा\n- स्पष्ट शीर्षके द्या\n\nप्रश्न: {question}",
-                    'kannada': f"ನೀವು ಒಬ್ಬ ಕೃಷಿ ತಜ್ಞರು. ರೈತರಿಗೆ ಕನ್ನಡದಲ್ಲಿ ನಿಖರವಾದ ಮತ್ತು ಪ್ರಾಯೋಗಿಕ ಸಲಹೆಯನ್ನು ನೀಡಿ. ದಯವಿಟ್ಟು ನಿಮ್ಮ ಉತ್ತರವನ್ನು ಈ ರೀತಿಯಲ್ಲಿ ಆಯೋಜಿಸಿ:\n- ಮುಖ್ಯ ವಿಷಯಗಳನ್ನು **ದಪ್ಪವಾಗಿ** ಬರೆಯಿರಿ\n- ಪಟ್ಟಿಗಳು ಮತ್ತು ಬುಲೆಟ್ ಪಾಯಿಂಟ್‌ಗಳನ್ನು ಬಳಸಿ\n- ವಿವಿಧ ವಿಭಾಗಗಳನ್ನು ರಚಿಸಿ\n- ಪ್ರಮುಖ ಸಲಹೆಗಳಿಗಾಗಿ ಇಮೋಜಿಗಳನ್ನು ಬಳಸಿ\n- ಸ್ಪಷ್ಟ ಶೀರ್ಷಿಕೆಗಳನ್ನು ನೀಡಿ\n\nಪ್ರಶ್ನೆ: {question}",
-                    'malayalam': f"നിങ്ങൾ ഒരു കൃഷി വിദഗ്ധനാണ്. കർഷകർക്ക് മലയാളത്തിൽ കൃത്യവും പ്രായോഗികവുമായ ഉപദേശം നൽകുക. ദയവായി നിങ്ങളുടെ ഉത്തരം ഈ രീതിയിൽ ക്രമീകരിക്കുക:\n- പ്രധാന പോയിന്റുകൾ **ബോൾഡിൽ** എഴുതുക\n- പട്ടികാകളും ബുള്ളറ്റ് പോയിന്റുകളും ഉപയോഗിക്കുക\n- വ്യത്യസ്ത വിഭാഗങ്ങൾ സൃഷ്ടിക്കുക\n- പ്രധാനപ്പെട്ട നിർദ്ദേശങ്ങൾക്ക് ഇമോജികൾ ഉപയോഗിക്കുക\n- വ്യക്തമായ തലക്കെട്ടുകൾ നൽകുക\n\nചോദ്യം: {question}",
-                    'odia': f"ଆପଣ ଜଣେ କୃଷି ବିଶେଷଜ୍ଞ। କୃଷକମାନଙ୍କୁ ଓଡ଼ିଆରେ ସଠିକ ଏବଂ ବ୍ୟବହାରିକ ପରାମର୍ଶ ଦିଅନ୍ତୁ। ଦୟାକରି ଆପଣଙ୍କ ଉତ୍ତରକୁ ଏହି ଉପାୟରେ ସଂଗଠିତ କରନ୍ତୁ:\n- ମୁଖ୍ୟ ବିଷୟଗୁଡ଼ିକୁ **ବୋଲ୍ଡରେ** ଲେଖନ୍ତୁ\n- ତାଲିକା ଏବଂ ବୁଲେଟ ପଏଣ୍ଟ ବ୍ୟବହାର କରନ୍ତୁ\n- ବିଭିନ୍ନ ବିଭାଗ ସୃଷ୍ଟି କରନ୍ତୁ\n- ଗୁରୁତ୍ୱପୂର୍ଣ୍ଣ ପରାମର୍ଶ ପାଇଁ ଇମୋଜି ବ୍ୟବହାର କରନ୍ତୁ\n- ସ୍ପଷ୍ଟ ଶୀର୍ଷକ ଦିଅନ୍ତୁ\n\nପ୍ରଶ୍ନ: {question}",
-                    'assamese': f"আপুনি এজন কৃষি বিশেষজ্ঞ। কৃষকসকলক অসমীয়াত সঠিক আৰু ব্যৱহাৰিক পৰামৰ্শ দিয়ক। দয়া কৰি আপোনাৰ উত্তৰটো এইদৰে সংগঠিত কৰক:\n- মূল কথাবোৰ **ব'ল্ডত** লিখক\n- তালিকা আৰু বুলেট পইণ্ট ব্যৱহাৰ কৰক\n- বেলেগ বেলেগ বিভাগ সৃষ্টি কৰক\n- গুৰুত্বপূৰ্ণ পৰামৰ্শৰ বাবে ইমোজি ব্যৱহাৰ কৰক\n- স্পষ্ট শিৰোনাম দিয়ক\n\nপ্ৰশ্ন: {question}",
-                    'urdu': f"آپ ایک زرعی ماہر ہیں۔ کسانوں کو اردو میں درست اور عملی مشورہ دیں۔ براہ کرم اپنا جواب اس طرح منظم کریں:\n- اہم نکات کو **بولڈ** میں لکھیں\n- فہرستیں اور بلٹ پوائنٹس استعمال کریں\n- مختلف سیکشن بنائیں\n- اہم تجاویز کے لیے ایموجی استعمال کریں\n- واضح سرخیاں دیں\n\nسوال: {question}"
-                }
-                
-                prompt = system_prompts.get(language, system_prompts['english'])
-                
-                print(f"Sending prompt to Gemini: {prompt[:100]}...")
-                
-                # Generate response using Gemini
-                response = model.generate_content(prompt)
-                response_text = response.text
-                
-                print(f"Raw Gemini response: {response_text[:200]}...")
-                
-                # Format the response for better readability
-                formatted_response = format_gemini_response(response_text)
-                
-                print(f"Formatted response: {formatted_response[:200]}...")
-                
-                # Calculate confidence score
-                confidence_data = calculate_confidence(formatted_response, question, language)
-                
-                print(f"Confidence calculated: {confidence_data['level']} ({confidence_data['score']}%)")
-                
-                return jsonify({
-                    'advice': formatted_response,
-                    'answer': formatted_response,
-                    'status': 'success',
-                    'language': language,
-                    'detectedLanguage': preferred_language,
-                    'confidence': confidence_data['level'],
-                    'confidenceScore': confidence_data['score'],
-                    'confidenceFactors': confidence_data['factors'],
-                    'sources': [],
-                    'safety_alternatives': ['Please consult with local agricultural experts for region-specific advice.'],
-                    'provider': 'gemini-pro'
-                })
-                
-            except Exception as e:
-                print(f"Gemini API Error: {e}")
-                print(f"Error type: {type(e)}")
-                import traceback
-                traceback.print_exc()
-                # Fall through to OpenAI or sample responses
-                pass
-        
-        if openai_api_key:
-            try:
-                # Use RAG system with OpenAI
-                index_dir = os.path.join(os.path.dirname(__file__), 'rag', 'index')
-                
-                # Prepare query for RAG system
-                user_query = {
-                    'text': question,
-                    'language': preferred_language
-                }
-                
-                # Check if index exists
-                if os.path.exists(index_dir):
-                    rag_response = rag_query.query_rag(user_query, index_dir)
-                    response_text = rag_response['answer']
-                    confidence = rag_response.get('confidence', 'Medium')
-                    sources = rag_response.get('sources', [])
-                    safety_alternatives = rag_response.get('safety_alternatives', [])
-                    
-                    return jsonify({
-                        'advice': response_text,
-                        'answer': response_text,
-                        'status': 'success',
-                        'language': language,
-                        'detectedLanguage': preferred_language,
-                        'confidence': confidence,
-                        'sources': sources,
-                        'safety_alternatives': safety_alternatives,
-                        'provider': 'openai-rag'
-                    })
-                else:
-                    # Use direct OpenAI if no RAG index
-                    import openai
-                    openai.api_key = openai_api_key
-                    
-                    # Language-specific system prompts
-                    system_prompts = {
-                        'hindi': "आप एक कृषि विशेषज्ञ हैं। किसानों को हिंदी में सटीक और व्यावहारिक सलाह दें।",
-                        'bengali': "আপনি একজন কৃষি বিশেষজ্ঞ। কৃষকদের বাংলায় সঠিক এবং ব্যবহারিক পরামর্শ দিন।",
-                        'gujarati': "તમે એક કૃષિ નિષ્ણાત છો। ખેડૂતોને ગુજરાતીમાં સચોટ અને વ્યવહારિક સલાહ આપો।",
-                        'punjabi': "ਤੁਸੀਂ ਇੱਕ ਖੇਤੀਬਾੜੀ ਮਾਹਰ ਹੋ। ਕਿਸਾਨਾਂ ਨੂੰ ਪੰਜਾਬੀ ਵਿੱਚ ਸਟੀਕ ਅਤੇ ਵਿਹਾਰਕ ਸਲਾਹ ਦਿਓ।",
-                        'telugu': "మీరు వ్యవసాయ నిపుణుడు. రైతులకు తెలుగులో ఖచ్చితమైన మరియు ఆచరణీయమైన సలహలు ఇవ్వండి।",
-                        'tamil': "நீங்கள் ஒரு விவசாய நிபுணர். விவசாயிகளுக்கு தமிழில் துல்லியமான மற்றும் நடைமுறை ஆலோசனைகளை வழங்கவும்।",
-                        'marathi': "तुम्ही एक कृषी तज्ञ आहात. शेतकऱ्यांना मराठीत अचूक आणि व्यावहारिक सल्ला द्या।",
-                        'kannada': "ನೀವು ಒಬ್ಬ ಕೃಷಿ ತಜ್ಞರು. ರೈತರಿಗೆ ಕನ್ನಡದಲ್ಲಿ ನಿಖರವಾದ ಮತ್ತು ಪ್ರಾಯೋಗಿಕ ಸಲಹೆಯನ್ನು ನೀಡಿ।",
-                        'malayalam': "നിങ്ങൾ ഒരു കൃഷി വിദഗ്ധനാണ്. കർഷകർക്ക് മലയാളത്തിൽ കൃത്യവും പ്രായോഗികവുമായ ഉപദേശം നൽകുക।",
-                        'odia': "ଆପଣ ଜଣେ କୃଷି ବିଶେଷଜ୍ଞ। କୃଷକମାନଙ୍କୁ ଓଡ଼ିଆରେ ସଠିକ ଏବଂ ବ୍ୟବହାରିକ ପରାମର୍ଶ ଦିଅନ୍ତୁ।",
-                        'assamese': "আপুনি এজন কৃষি বিশেষজ্ঞ। কৃষকসকলক অসমীয়াত সঠিক আৰু ব্যৱহাৰিক পৰামৰ্শ দিয়ক।",
-                        'urdu': "آپ ایک زرعی ماہر ہیں۔ کسانوں کو اردو میں درست اور عملی مشورہ دیں۔",
-                        'arabic': "أنت خبير زراعي. قدم نصائح دقيقة وعملية للمزارعين باللغة العربية.",
-                        'english': "You are an agricultural expert. Provide accurate and practical advice to farmers in English."
-                    }
-                    
-                    system_prompt = system_prompts.get(language, system_prompts['english'])
-                    
-                    response = openai.ChatCompletion.create(
-                        model='gpt-3.5-turbo',
-                        messages=[
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": question}
-                        ],
-                        max_tokens=500,
-                        temperature=0.7
-                    )
-                    
-                    response_text = response['choices'][0]['message']['content']
-                    
-                    return jsonify({
-                        'advice': response_text,
-                        'answer': response_text,
-                        'status': 'success',
-                        'language': language,
-                        'detectedLanguage': preferred_language,
-                        'confidence': 'High',
-                        'sources': [],
-                        'safety_alternatives': ['Please consult with local agricultural experts for region-specific advice.'],
-                        'provider': 'openai-direct'
-                    })
-                    
-            except Exception as e:
-                print(f"OpenAI API Error: {e}")
-                # Fallback to sample responses if OpenAI fails
-                pass
-        
-        # Fallback to sample responses if no API key or error
-        language_responses = {
-            'hindi': f"""🌾 **कृषि मित्र AI सहायक**
+Question: """,
+    'telugu': "మీరు వ్యవసాయ నిపుణుడు. రైతులకు తెలుగులో ఖచ్చితమైన మరియు ఆచరణీయమైన సలహలు ఇవ్వండి. దయచేసి మీ సమాధానాన్ని ఈ విధంగా నిర్వహించండి:\n- ముఖ్య అంశాలను **బోల్డ్** లో రాయండి\n- జాబితాలు మరియు బుల్లెట్ పాయింట్లను వాడండి\n- వేర్వేరు విభాగాలను సృష్టించండి\n- ముఖ్యమైన సూచనల కోసం ఇమోజీలను వాడండి\n- స్పష్టమైన శీర్షికలు ఇవ్వండి\n\nప్రశ్న: ",
+    'tamil': "நீங்கள் ஒரு விவசாய நிபுணர். விவசாயிகளுக்கு தமிழில் துல்லியமான மற்றும் நடைமுறை ஆலோசனைகளை வழங்கவும். உங்கள் பதிலை இந்த வகையில் அமைக்கவும்:\n- முக்கிய புள்ளிகளை **தடிமனாக** எழுதவும்\n- பட்டியல்கள் மற்றும் புள்ளி குறிகளைப் பயன்படுத்தவும்\n- வெவ்வேறு பிரிவுகளை உருவாக்கவும்\n- முக்கியமான ஆலோசனைகளுக்கு இமோஜிகளைப் பயன்படுத்தவும்\n- தெளிவான தலைப்புகளைக் கொடுக்கவும்\n\nகேள்வி: ",
+    'marathi': "तुम्ही एक कृषी तज्ञ आहात. शेतकऱ्यांना मराठीत अचूक आणि व्यावहारिक सल्ला द्या. कृपया तुमचे उत्तर या पद्धतीने मांडा:\n- मुख्य मुद्दे **ठळक** अक्षरात लिहा\n- यादी आणि बुलेट पॉइंट्स वापरा\n- वेगवेगळे विभाग तयार करा\n- महत्त्वाच्या सूचनांसाठी इमोजी वापरा\n- स्पष्ट शीर्षके द्या\n\nप्रश्न: ",
+    'kannada': "ನೀವು ಒಬ್ಬ ಕೃಷಿ ತಜ್ಞರು. ರೈತರಿಗೆ ಕನ್ನಡದಲ್ಲಿ ನಿಖರವಾದ ಮತ್ತು ಪ್ರಾಯೋಗಿಕ ಸಲಹೆಯನ್ನು ನೀಡಿ. ದಯವಿಟ್ಟು ನಿಮ್ಮ ಉತ್ತರವನ್ನು ಈ ರೀತಿಯಲ್ಲಿ ಆಯೋಜಿಸಿ:\n- ಮುಖ್ಯ ವಿಷಯಗಳನ್ನು **ದಪ್ಪವಾಗಿ** ಬರೆಯಿರಿ\n- ಪಟ್ಟಿಗಳು ಮತ್ತು ಬುಲೆಟ್ ಪಾಯಿಂಟ್‌ಗಳನ್ನು ಬಳಸಿ\n- ವಿವಿಧ ವಿಭಾಗಗಳನ್ನು ರಚಿಸಿ\n- ಪ್ರಮುಖ ಸಲಹೆಗಳಿಗಾಗಿ ಇಮೋಜಿಗಳನ್ನು ಬಳಸಿ\n- ಸ್ಪಷ್ಟ ಶೀರ್ಷಿಕೆಗಳನ್ನು ನೀಡಿ\n\nಪ್ರಶ್ನೆ: ",
+    'malayalam': "നിങ്ങൾ ഒരു കൃഷി വിദഗ്ധനാണ്. കർഷകർക്ക് മലയാളത്തിൽ കൃത്യവും പ്രായോഗികവുമായ ഉപദേശം നൽകുക. ദയവായി നിങ്ങളുടെ ഉത്തരം ഈ രീതിയിൽ ക്രമീകരിക്കുക:\n- പ്രധാന പോയിന്റുകൾ **ബോൾഡിൽ** എഴുതുക\n- പട്ടികാകളും ബുള്ളറ്റ് പോയിന്റുകളും ഉപയോഗിക്കുക\n- വ്യത്യസ്ത വിഭാഗങ്ങൾ സൃഷ്ടിക്കുക\n- പ്രധാനപ്പെട്ട നിർദ്ദേശങ്ങൾക്ക് ഇമോജികൾ ഉപയോഗിക്കുക\n- വ്യക്തമായ തലക്കെട്ടുകൾ നൽകുക\n\nചോദ്യം: ",
+    'odia': "ଆପଣ ଜଣେ କୃଷି ବିଶେଷଜ୍ଞ। କୃଷକମାନଙ୍କୁ ଓଡ଼ିଆରେ ସଠିକ ଏବଂ ବ୍ୟବହାରିକ ପରାମର୍ଶ ଦିଅନ୍ତୁ। ଦୟାକରି ଆପଣଙ୍କ ଉତ୍ତରକୁ ଏହି ଉପାୟରେ ସଂଗଠିତ କରନ୍ତୁ:\n- ମୁଖ୍ୟ ବିଷୟଗୁଡ଼ିକୁ **ବୋଲ୍ଡରେ** ଲେଖନ୍ତୁ\n- ତାଲିକା ଏବଂ ବୁଲେଟ ପଏଣ୍ଟ ବ୍ୟବହାର କରନ୍ତୁ\n- ବିଭିନ୍ନ ବିଭାଗ ସୃଷ୍ଟି କରନ୍ତୁ\n- ଗୁରୁତ୍ୱପୂର୍ଣ୍ଣ ପରାମର୍ଶ ପାଇଁ ଇମୋଜି ବ୍ୟବହାର କରନ୍ତୁ\n- ସ୍ପଷ୍ଟ ଶୀର୍ଷକ ଦିଅନ୍ତୁ\n\nପ୍ରଶ୍ନ: ",
+    'assamese': "আপুনি এজন কৃষি বিশেষজ্ঞ। কৃষকসকলক অসমীয়াত সঠিক আৰু ব্যৱহাৰিক পৰামৰ্শ দিয়ক। দয়া কৰি আপোনাৰ উত্তৰটো এইদৰে সংগঠিত কৰক:\n- মূল কথাবোৰ **ব'ল্ডত** লিখক\n- তালিকা আৰু বুলেট পইণ্ট ব্যৱহাৰ কৰক\n- বেলেগ বেলেগ বিভাগ সৃষ্টি কৰক\n- গুৰুত্বপূৰ্ণ পৰামৰ্শৰ বাবে ইমোজি ব্যৱহাৰ কৰক\n- স্পষ্ট শিৰোনাম দিয়ক\n\nপ্ৰশ্ন: ",
+    'urdu': "آپ ایک زرعی ماہر ہیں۔ کسانوں کو اردو میں درست اور عملی مشورہ دیں۔ براہ کرم اپنا جواب اس طرح منظم کریں:\n- اہم نکات کو **بولڈ** میں لکھیں\n- فہرستیں اور بلٹ پوائنٹس استعمال کریں\n- مختلف سیکشن بنائیں\n- اہم تجاویز کے لیے ایموجی استعمال کریں\n- واضح سرخیاں دیں\n\nسوال: "
+}
+
+# Gemini request bodies as UTF-8 JSON up to the question, so only the question
+# is escaped and encoded per request
+_GEMINI_BODY_HEADS = {
+    language: b'{"contents":[{"parts":[{"text":' + dumps_json(prefix)[:-1]
+    for language, prefix in _GEMINI_PROMPT_PREFIXES.items()
+}
+_GEMINI_BODY_TAIL = b'}]}]}'
+
+def gemini_body(body_head, question):
+    """
+    Complete a pre-encoded Gemini request body with the JSON-escaped question
+    """
+    # The head ends inside the open text string; the question's closing quote ends it
+    return body_head + dumps_json(question)[1:] + _GEMINI_BODY_TAIL
+
+def _gemini_advice(body_head, language, session, question):
+    """
+    Ask Gemini with a language-specific prompt, then format and score the answer
+    """
+    logger.debug("gemini language=%s question=%.100s", language, question)
+    
+    response_text = gemini_generate(session, gemini_body(body_head, question))
+    logger.debug("gemini raw response=%.200s", response_text)
+    
+    # Format the response for better readability
+    formatted_response = format_gemini_response(response_text)
+    return formatted_response, calculate_confidence(formatted_response, question, language)
+
+# One handler per language, built once; advice() dispatches with a single lookup
+_GEMINI_HANDLERS = {
+    language: partial(_gemini_advice, body_head, language)
+    for language, body_head in _GEMINI_BODY_HEADS.items()
+}
+
+def format_paragraphs(pieces):
+    """
+    Format streamed text one finished paragraph at a time
+    """
+    buf = ''
+    for piece in pieces:
+        buf += piece
+        if '\n\n' in buf:
+            head, _, buf = buf.rpartition('\n\n')
+            yield format_gemini_response(head) + '\n\n'
+    if buf:
+        yield format_gemini_response(buf)
+
+def sse_event(payload, event=None):
+    """
+    Encode one server-sent event with a JSON data line
+    """
+    prefix = b'event: ' + event.encode() + b'\n' if event else b''
+    return prefix + b'data: ' + dumps_json(payload) + b'\n\n'
+
+# Language-specific system prompts for direct OpenAI chat completions
+_OPENAI_SYSTEM_PROMPTS = {
+    'hindi': "आप एक कृषि विशेषज्ञ हैं। किसानों को हिंदी में सटीक और व्यावहारिक सलाह दें।",
+    'bengali': "আপনি একজন কৃষি বিশেষজ্ঞ। কৃষকদের বাংলায় সঠিক এবং ব্যবহারিক পরামর্শ দিন।",
+    'gujarati': "તમે એક કૃષિ નિષ્ણાત છો। ખેડૂતોને ગુજરાતીમાં સચોટ અને વ્યવહારિક સલાહ આપો।",
+    'punjabi': "ਤੁਸੀਂ ਇੱਕ ਖੇਤੀਬਾੜੀ ਮਾਹਰ ਹੋ। ਕਿਸਾਨਾਂ ਨੂੰ ਪੰਜਾਬੀ ਵਿੱਚ ਸਟੀਕ ਅਤੇ ਵਿਹਾਰਕ ਸਲਾਹ ਦਿਓ।",
+    'telugu': "మీరు వ్యవసాయ నిపుణుడు. రైతులకు తెలుగులో ఖచ్చితమైన మరియు ఆచరణీయమైన సలహలు ఇవ్వండి।",
+    'tamil': "நீங்கள் ஒரு விவசாய நிபுணர். விவசாயிகளுக்கு தமிழில் துல்லியமான மற்றும் நடைமுறை ஆலோசனைகளை வழங்கவும்।",
+    'marathi': "तुम्ही एक कृषी तज्ञ आहात. शेतकऱ्यांना मराठीत अचूक आणि व्यावहारिक सल्ला द्या।",
+    'kannada': "ನೀವು ಒಬ್ಬ ಕೃಷಿ ತಜ್ಞರು. ರೈತರಿಗೆ ಕನ್ನಡದಲ್ಲಿ ನಿಖರವಾದ ಮತ್ತು ಪ್ರಾಯೋಗಿಕ ಸಲಹೆಯನ್ನು ನೀಡಿ।",
+    'malayalam': "നിങ്ങൾ ഒരു കൃഷി വിദഗ്ധനാണ്. കർഷകർക്ക് മലയാളത്തിൽ കൃത്യവും പ്രായോഗികവുമായ ഉപദേശം നൽകുക।",
+    'odia': "ଆପଣ ଜଣେ କୃଷି ବିଶେଷଜ୍ଞ। କୃଷକମାନଙ୍କୁ ଓଡ଼ିଆରେ ସଠିକ ଏବଂ ବ୍ୟବହାରିକ ପରାମର୍ଶ ଦିଅନ୍ତୁ।",
+    'assamese': "আপুনি এজন কৃষি বিশেষজ্ঞ। কৃষকসকলক অসমীয়াত সঠিক আৰু ব্যৱহাৰিক পৰামৰ্শ দিয়ক।",
+    'urdu': "آپ ایک زرعی ماہر ہیں۔ کسانوں کو اردو میں درست اور عملی مشورہ دیں۔",
+    'arabic': "أنت خبير زراعي. قدم نصائح دقيقة وعملية للمزارعين باللغة العربية.",
+    'english': "You are an agricultural expert. Provide accurate and practical advice to farmers in English."
+}
+
+# Demo responses per language, filled in with the question
+_SAMPLE_RESPONSE_TEMPLATES = {
+    'hindi': """🌾 **कृषि मित्र AI सहायक**
 
 आपके प्रश्न के लिए धन्यवाद: '{question}'
 
@@ -652,8 +954,8 @@ Question: {question}""",
 
 • स्थानीय कृषि विशेषज्ञों से सलाह लें
 • अपने क्षेत्र के अनुकूल तकनीकों का प्रयोग करें""",
-            
-            'bengali': f"""🌾 **কৃষি মিত্র AI সহায়ক**
+    
+    'bengali': """🌾 **কৃষি মিত্র AI সহায়ক**
 
 আপনার প্রশ্নের জন্য ধন্যবাদ: '{question}'
 
@@ -671,8 +973,8 @@ Question: {question}""",
 
 • স্থানীয় কৃষি বিশেষজ্ঞদের পরামর্শ নিন
 • আপনার অঞ্চলের উপযুক্ত প্রযুক্তি ব্যবহার করুন""",
-            
-            'gujarati': f"""🌾 **કૃષિ મિત્ર AI સહાયક**
+    
+    'gujarati': """🌾 **કૃષિ મિત્ર AI સહાયક**
 
 તમારા પ્રશ્ન માટે આભાર: '{question}'
 
@@ -690,8 +992,8 @@ Question: {question}""",
 
 • સ્થાનિક કૃષિ નિષ્ણાતોની સલાહ લો
 • તમારા વિસ્તાર અનુકૂળ તકનીકોનો ઉપયોગ કરો""",
-            
-            'punjabi': f"""🌾 **ਕ੍ਰਿਸ਼ੀ ਮਿੱਤਰ AI ਸਹਾਇਕ**
+    
+    'punjabi': """🌾 **ਕ੍ਰਿਸ਼ੀ ਮਿੱਤਰ AI ਸਹਾਇਕ**
 
 ਤੁਹਾਡੇ ਸਵਾਲ ਲਈ ਧੰਨਵਾਦ: '{question}'
 
@@ -709,8 +1011,8 @@ Question: {question}""",
 
 • ਸਥਾਨਕ ਖੇਤੀਬਾੜੀ ਮਾਹਰਾਂ ਤੋਂ ਸਲਾਹ ਲਓ
 • ਆਪਣੇ ਖੇਤਰ ਅਨੁਕੂਲ ਤਕਨੀਕਾਂ ਦੀ ਵਰਤੋਂ ਕਰੋ""",
-            
-            'arabic': f"""🌾 **مساعد كريشي ميترا الذكي**
+    
+    'arabic': """🌾 **مساعد كريشي ميترا الذكي**
 
 شكرا لك على سؤالك: '{question}'
 
@@ -728,8 +1030,8 @@ Question: {question}""",
 
 • استشر خبراء الزراعة المحليين
 • استخدم التقنيات المناسبة لمنطقتك""",
-            
-            'english': f"""🌾 **Krishi Mitra AI Assistant**
+    
+    'english': """🌾 **Krishi Mitra AI Assistant**
 
 Thank you for your question: '{question}'
 
@@ -756,8 +1058,8 @@ Thank you for your question: '{question}'
 • Get your free Gemini API key from Google AI Studio
 • Or set up OpenAI API key for enhanced responses
 • Configure the API key in your environment variables""",
-            
-            'telugu': f"""🌾 **కృషి మిత్ర AI సహాయకుడు**
+    
+    'telugu': """🌾 **కృషి మిత్ర AI సహాయకుడు**
 
 మీ ప్రశ్నకు ధన్యవాదాలు: '{question}'
 
@@ -775,8 +1077,8 @@ Thank you for your question: '{question}'
 
 • స్థానిక వ్యవసాయ నిపుణులను సంప్రదించండి
 • మీ ప్రాంతానికి అనుకూలమైన వ్యవసాయ పద్ధతులను వాడండి""",
-            
-            'tamil': f"""🌾 **கிருஷி மித்ரா AI உதவியாளர்**
+    
+    'tamil': """🌾 **கிருஷி மித்ரா AI உதவியாளர்**
 
 உங்கள் கேள்விக்கு நன்றி: '{question}'
 
@@ -794,8 +1096,8 @@ Thank you for your question: '{question}'
 
 • உள்ளூர் வேளாண் நிபுணர்களைக் கலந்தாலோசிக்கவும்
 • உங்கள் பகுதிக்கு ஏற்ற நுட்பங்களைப் பயன்படுத்தவும்""",
-            
-            'marathi': f"""🌾 **कृषी मित्र AI सहाय्यक**
+    
+    'marathi': """🌾 **कृषी मित्र AI सहाय्यक**
 
 तुमच्या प्रश्नाबद्दल धन्यवाद: '{question}'
 
@@ -813,8 +1115,8 @@ Thank you for your question: '{question}'
 
 • स्थानिक कृषी तज्ञांचा सल्ला घ्या
 • तुमच्या क्षेत्रासाठी योग्य तंत्र वापरा""",
-            
-            'kannada': f"""🌾 **ಕೃಷಿ ಮಿತ್ರ AI ಸಹಾಯಕ**
+    
+    'kannada': """🌾 **ಕೃಷಿ ಮಿತ್ರ AI ಸಹಾಯಕ**
 
 ನಿಮ್ಮ ಪ್ರಶ್ನೆಗೆ ಧನ್ಯವಾದಗಳು: '{question}'
 
@@ -832,8 +1134,8 @@ Thank you for your question: '{question}'
 
 • ಸ್ಥಳೀಯ ಕೃಷಿ ತಜ್ಞರನ್ನು ಸಂಪರ್ಕಿಸಿ
 • ನಿಮ್ಮ ಪ್ರದೇಶಕ್ಕೆ ಸೂಕ್ತವಾದ ತಂತ್ರಗಳನ್ನು ಬಳಸಿ""",
-            
-            'malayalam': f"""🌾 **കൃഷി മിത്ര AI സഹായി**
+    
+    'malayalam': """🌾 **കൃഷി മിത്ര AI സഹായി**
 
 നിങ്ങളുടെ ചോദ്യത്തിന് നന്ദി: '{question}'
 
@@ -851,8 +1153,8 @@ Thank you for your question: '{question}'
 
 • പ്രാദേശിക കൃഷി വിദഗ്ധരുമായി കൂടിയാലോചിക്കുക
 • നിങ്ങളുടെ പ്രദേശത്തിന് അനുയോജ്യമായ സാങ്കേതികവിദ്യകൾ ഉപയോഗിക്കുക""",
-            
-            'odia': f"""🌾 **କୃଷି ମିତ୍ର AI ସହାୟକ**
+    
+    'odia': """🌾 **କୃଷି ମିତ୍ର AI ସହାୟକ**
 
 ଆପଣଙ୍କ ପ୍ରଶ୍ନ ପାଇଁ ଧନ୍ୟବାଦ: '{question}'
 
@@ -870,8 +1172,8 @@ Thank you for your question: '{question}'
 
 • ସ୍ଥାନୀୟ କୃଷି ବିଶେଷଜ୍ଞଙ୍କ ସହିତ ପରାମର୍ଶ କରନ୍ତୁ
 • ଆପଣଙ୍କ ଅଞ୍ଚଳ ଅନୁକୂଳ ପ୍ରଯୁକ୍ତି ବ୍ୟବହାର କରନ୍ତୁ""",
-            
-            'assamese': f"""🌾 **কৃষি মিত্ৰ AI সহায়ক**
+    
+    'assamese': """🌾 **কৃষি মিত্ৰ AI সহায়ক**
 
 আপোনাৰ প্ৰশ্নৰ বাবে ধন্যবাদ: '{question}'
 
@@ -889,8 +1191,8 @@ Thank you for your question: '{question}'
 
 • স্থানীয় কৃষি বিশেষজ্ঞৰ পৰামৰ্শ লওক
 • আপোনাৰ অঞ্চলৰ উপযুক্ত প্ৰযুক্তি ব্যৱহাৰ কৰক""",
-            
-            'urdu': f"""🌾 **کرشی مترا AI اسسٹنٹ**
+    
+    'urdu': """🌾 **کرشی مترا AI اسسٹنٹ**
 
 آپ کے سوال کے لیے شکریہ: '{question}'
 
@@ -908,29 +1210,231 @@ Thank you for your question: '{question}'
 
 • مقامی زرعی ماہرین سے مشورہ لیں
 • اپنے علاقے کے موزوں طریقے استعمال کریں"""
-        }
+}
+
+def _prebake_sample_response(template):
+    """
+    Format a sample template once and split it around the question
+    """
+    marker = '\x00'
+    prefix, suffix = format_gemini_response(template.format(question=marker)).split(marker)
+    return prefix, suffix
+
+# Formatted at import; only the question is spliced in per request
+_SAMPLE_RESPONSE_PARTS = {
+    language: _prebake_sample_response(template)
+    for language, template in _SAMPLE_RESPONSE_TEMPLATES.items()
+}
+
+def sample_response(question, language, preferred_language):
+    """
+    Build the demo response used when no AI provider is available
+    """
+    prefix, suffix = _SAMPLE_RESPONSE_PARTS.get(language, _SAMPLE_RESPONSE_PARTS['english'])
+    formatted_response = prefix + question + suffix
+    
+    return jsonify({
+        'advice': formatted_response,
+        'answer': formatted_response,
+        'status': 'success',
+        'language': language,
+        'detectedLanguage': preferred_language,
+        'confidence': 'Low',
+        'sources': [],
+        'safety_alternatives': ['Please set up Gemini or OpenAI API key for AI-powered responses.'],
+        'provider': 'sample'
+    })
+
+RAG_INDEX_DIR = os.path.join(os.path.dirname(__file__), 'rag', 'index')
+
+def prewarm_rag():
+    """
+    Load the RAG index and models at startup so the first /advice request doesn't pay for it
+    """
+    if not os.getenv('OPENAI_API_KEY') or not os.path.exists(RAG_INDEX_DIR):
+        return
+    try:
+        # Local work only: importing the app must not block on the embeddings API
+        rag_query.warmup(RAG_INDEX_DIR)
+        rag_query.get_llm()
+    except Exception:
+        logger.exception("Could not prewarm the RAG pipeline")
+
+prewarm_rag()
+
+@app.route('/advice', methods=['POST'])
+@rate_limiter()
+def advice():
+    try:
+        data = request.get_json(force=True)
+        question = data.get('question') or data.get('text')  # Support both 'question' and 'text'
+        language = data.get('language', 'english')  # Get language preference
+        preferred_language = data.get('preferredLanguage', 'en-US')  # Get language code
+        
+        if not question:
+            return error_response('missing_param', 'question or text required')
         
-        response_text = language_responses.get(language, language_responses['english'])
+        # Junk input never reaches an LLM
+        if is_trivial_question(question):
+            return sample_response(question, language, preferred_language)
         
-        # Apply formatting to sample responses as well
-        formatted_response = format_gemini_response(response_text)
+        cached = recent_answer(request.remote_addr, question, language)
+        if cached is not None:
+            return jsonify(cached)
         
-        return jsonify({
-            'advice': formatted_response,
-            'answer': formatted_response,
-            'status': 'success',
-            'language': language,
-            'detectedLanguage': preferred_language,
-            'confidence': 'Low',
-            'sources': [],
-            'safety_alternatives': ['Please set up Gemini or OpenAI API key for AI-powered responses.'],
-            'provider': 'sample'
-        })
+        logger.debug("question=%s language=%s preferred_language=%s", question, language, preferred_language)
+        
+        # Check for Gemini API key first, then OpenAI
+        gemini_api_key = os.getenv('GEMINI_API_KEY')
+        openai_api_key = os.getenv('OPENAI_API_KEY')
+        
+        logger.debug("gemini_key=%s openai_key=%s", bool(gemini_api_key), bool(openai_api_key))
+        
+        if not gemini_api_key and not openai_api_key:
+            return error_response('api_key_missing', 'Neither GEMINI_API_KEY nor OPENAI_API_KEY is configured'), 500
+        
+        if _GEMINI_SESSION is not None:
+            try:
+                # Use Google Gemini API
+                handler = _GEMINI_HANDLERS.get(language, _GEMINI_HANDLERS['english'])
+                formatted_response, confidence_data = handler(_GEMINI_SESSION, question)
+                
+                logger.debug("confidence=%s (%s%%)", confidence_data['level'], confidence_data['score'])
+                
+                payload = {
+                    'advice': formatted_response,
+                    'answer': formatted_response,
+                    'status': 'success',
+                    'language': language,
+                    'detectedLanguage': preferred_language,
+                    'confidence': confidence_data['level'],
+                    'confidenceScore': confidence_data['score'],
+                    'confidenceFactors': confidence_data['factors'],
+                    'sources': [],
+                    'safety_alternatives': ['Please consult with local agricultural experts for region-specific advice.'],
+                    'provider': 'gemini-pro'
+                }
+                remember_answer(request.remote_addr, question, language, payload)
+                return jsonify(payload)
+                
+            except Exception:
+                logger.exception("Gemini API error")
+                # Fall through to OpenAI or sample responses
+        
+        if openai_api_key:
+            try:
+                # Use RAG system with OpenAI
+                # Prepare query for RAG system
+                user_query = {
+                    'text': question,
+                    'language': preferred_language
+                }
+                
+                # Check if index exists
+                if os.path.exists(RAG_INDEX_DIR):
+                    rag_response = rag_query.query_rag(user_query, RAG_INDEX_DIR)
+                    response_text = rag_response['answer']
+                    confidence = rag_response.get('confidence', 'Medium')
+                    sources = rag_response.get('sources', [])
+                    safety_alternatives = rag_response.get('safety_alternatives', [])
+                    
+                    payload = {
+                        'advice': response_text,
+                        'answer': response_text,
+                        'status': 'success',
+                        'language': language,
+                        'detectedLanguage': preferred_language,
+                        'confidence': confidence,
+                        'sources': sources,
+                        'safety_alternatives': safety_alternatives,
+                        'provider': 'openai-rag'
+                    }
+                    remember_answer(request.remote_addr, question, language, payload)
+                    return jsonify(payload)
+                else:
+                    # Use direct OpenAI if no RAG index
+                    if openai is None:
+                        raise ImportError('openai package is not installed')
+                    
+                    system_prompt = _OPENAI_SYSTEM_PROMPTS.get(language, _OPENAI_SYSTEM_PROMPTS['english'])
+                    
+                    response = openai.ChatCompletion.create(
+                        model='gpt-3.5-turbo',
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": question}
+                        ],
+                        max_tokens=500,
+                        temperature=0.7
+                    )
+                    
+                    response_text = response['choices'][0]['message']['content']
+                    
+                    payload = {
+                        'advice': response_text,
+                        'answer': response_text,
+                        'status': 'success',
+                        'language': language,
+                        'detectedLanguage': preferred_language,
+                        'confidence': 'High',
+                        'sources': [],
+                        'safety_alternatives': ['Please consult with local agricultural experts for region-specific advice.'],
+                        'provider': 'openai-direct'
+                    }
+                    remember_answer(request.remote_addr, question, language, payload)
+                    return jsonify(payload)
+                    
+            except Exception as e:
+                logger.warning("OpenAI API error: %s", e)
+                # Fallback to sample responses if OpenAI fails
+                pass
+        
+        # Fallback to sample responses if no API key or error
+        return sample_response(question, language, preferred_language)
         
     except Exception as e:
-        print(f"Error in advice endpoint: {e}")
+        logger.exception("Error in advice endpoint")
         return error_response('bad_request', str(e), 400)
 
+@app.route('/advice/stream', methods=['POST'])
+@rate_limiter()
+def advice_stream():
+    """
+    Stream Gemini advice as server-sent events, one formatted paragraph per event
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    question = data.get('question') or data.get('text')
+    language = data.get('language', 'english')
+    
+    if not question:
+        return error_response('missing_param', 'question or text required')
+    if _GEMINI_SESSION is None:
+        return error_response('api_key_missing', 'GEMINI_API_KEY is not configured', 503)
+    
+    body = gemini_body(_GEMINI_BODY_HEADS.get(language, _GEMINI_BODY_HEADS['english']), question)
+    
+    def generate():
+        parts = []
+        try:
+            for text in format_paragraphs(gemini_stream(_GEMINI_SESSION, body)):
+                parts.append(text)
+                yield sse_event({'text': text})
+        except Exception:
+            logger.exception("Gemini streaming error")
+            yield sse_event({'error': 'provider_error'}, 'error')
+            return
+        
+        confidence_data = calculate_confidence(''.join(parts).strip(), question, language)
+        yield sse_event({
+            'status': 'success',
+            'language': language,
+            'confidence': confidence_data['level'],
+            'confidenceScore': confidence_data['score'],
+            'provider': 'gemini-pro'
+        }, 'done')
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
 @app.errorhandler(404)
 def not_found(e):
     return error_response('not_found', 'Endpoint does not exist', 404)
@@ -942,6 +1446,6 @@ def server_error(e):
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5001))
     host = os.getenv('HOST', '0.0.0.0')
-    print("Starting Krishi Mitra Backend Server...")
-    print(f"Server will be available at: http://{host}:{port}")
+    logger.info("Starting Krishi Mitra Backend Server...")
+    logger.info("Server will be available at: http://%s:%s", host, port)
     app.run(host=host, port=port, debug=True, use_reloader=False)
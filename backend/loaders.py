@@ -3,35 +3,93 @@ import json
 import csv
 from datetime import datetime
 
-def load_json(path):
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import polars
+except ImportError:
+    polars = None
+
+# Parsed JSON per path, with the file mtime it was parsed at
+_CACHE = {}
+
+def _parse_json(path):
+    if orjson:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
     with open(path, encoding='utf-8') as f:
         return json.load(f)
 
+def load_json(path, mtime=None):
+    # Unchanged files are served from _CACHE, so a repeat load costs one stat
+    if mtime is None:
+        mtime = os.path.getmtime(path)
+    cached = _CACHE.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    data = _parse_json(path)
+    _CACHE[path] = (mtime, data)
+    return data
+
+def _polars_rows(path):
+    """
+    Rows parsed by polars, or None when the file has anything polars reads
+    differently from csv.DictReader
+    """
+    with open(path, encoding='utf-8', newline='') as f:
+        header = next(csv.reader(f), None)
+    # polars strips a BOM and renames duplicate columns; DictReader keeps both
+    if not header or header[0].startswith('\ufeff') or len(set(header)) != len(header):
+        return None
+    try:
+        df = polars.read_csv(path, infer_schema_length=0, encoding='utf8')
+    except polars.exceptions.PolarsError:
+        # e.g. rows with extra fields, which DictReader files under a None key
+        return None
+    # Nulls come from unquoted empty cells, short rows and blank lines, which
+    # DictReader turns into '', None and no row respectively
+    if any(df.null_count().row(0)):
+        return None
+    return df.to_dicts()
+
 def load_csv(path):
+    # Every column is read as a string, so the native parser gives the same
+    # rows as csv.DictReader; files it can't match exactly go through csv
+    if polars:
+        rows = _polars_rows(path)
+        if rows is not None:
+            return rows
     with open(path, encoding='utf-8') as f:
         reader = csv.DictReader(f)
         return list(reader)
 
+def format_mtime(mtime):
+    return datetime.utcfromtimestamp(mtime).strftime('%a, %d %b %Y %H:%M:%S GMT')
+
 def get_file_mtime(path):
-    return datetime.utcfromtimestamp(os.path.getmtime(path)).strftime('%a, %d %b %Y %H:%M:%S GMT')
+    return format_mtime(os.path.getmtime(path))
 
 def get_etag(path):
     return str(os.path.getmtime(path))
 
+def load_sample(data_dir, filename):
+    # One stat covers the cache check, Last-Modified and ETag
+    path = os.path.join(data_dir, filename)
+    mtime = os.path.getmtime(path)
+    return load_json(path, mtime), format_mtime(mtime), str(mtime)
+
 # Loader functions for each data type
 
 def load_weather_sample(data_dir):
-    path = os.path.join(data_dir, 'weather.json')
-    return load_json(path), get_file_mtime(path), get_etag(path)
+    return load_sample(data_dir, 'weather.json')
 
 def load_advisory_sample(data_dir):
-    path = os.path.join(data_dir, 'advisories.json')
-    return load_json(path), get_file_mtime(path), get_etag(path)
+    return load_sample(data_dir, 'advisories.json')
 
 def load_market_sample(data_dir):
-    path = os.path.join(data_dir, 'market.json')
-    return load_json(path), get_file_mtime(path), get_etag(path)
+    return load_sample(data_dir, 'market.json')
 
 def load_soil_sample(data_dir):
-    path = os.path.join(data_dir, 'soil.json')
-    return load_json(path), get_file_mtime(path), get_etag(path)
+    return load_sample(data_dir, 'soil.json')
@@ -1,26 +1,184 @@
 import os
 import json
+import hashlib
+import sqlite3
 import faiss
 import numpy as np
 from typing import List, Dict, Any
+from rag.hnsw_index import build_cosine_index, configure_search
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import blake3
+except ImportError:
+    blake3 = None
 
 # You need to provide your own tokenizer, e.g. from transformers
-from transformers import AutoTokenizer
-
-def chunk_text(text: str, tokenizer, max_tokens=512, overlap=50) -> List[str]:
-    tokens = tokenizer.encode(text, add_special_tokens=False)
-    chunks = []
-    i = 0
-    while i < len(tokens):
-        chunk = tokens[i:i+max_tokens]
-        chunk_text = tokenizer.decode(chunk)
-        chunks.append(chunk_text)
-        if i + max_tokens >= len(tokens):
-            break
-        i += max_tokens - overlap
-    return chunks
-
-def build_faiss_index(docs: List[Dict[str, Any]], embed_fn, tokenizer, out_path: str):
+try:
+    from transformers import AutoTokenizer
+except ImportError:
+    AutoTokenizer = None
+
+def read_json(path: str):
+    if orjson:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def write_json(path: str, obj):
+    # Compact output; pretty-printing only inflated file size and parse time
+    if orjson:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(obj))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, separators=(',', ':'))
+
+def chunk_text(text: str, tokenizer, max_tokens=512, overlap=50, min_tokens=100) -> List[str]:
+    # Needs a fast tokenizer: windows are sliced out of the original text by
+    # character offsets instead of decoding tokens back to strings
+    offsets = tokenizer(text, return_offsets_mapping=True, add_special_tokens=False)['offset_mapping']
+    n = len(offsets)
+    if n == 0:
+        return []
+    if n <= max_tokens:
+        return [text[offsets[0][0]:offsets[-1][1]]]
+    offsets = np.asarray(offsets, dtype=np.int64)
+    # All window starts at once: ceil((n - max_tokens + step) / step) windows
+    step = max_tokens - overlap
+    starts = np.arange(-(-(n - max_tokens) // step) + 1) * step
+    # A short tail is folded into a full-size last window rather than left as a tiny chunk
+    if n - starts[-1] < min_tokens:
+        starts[-1] = n - max_tokens
+    ends = np.minimum(starts + max_tokens, n) - 1
+    spans = zip(offsets[starts, 0].tolist(), offsets[ends, 1].tolist())
+    return [text[start:end] for start, end in spans]
+
+def embed_in_batches(texts: List[str], embed_fn, batch_size=32) -> np.ndarray:
+    # Length-sorted mini-batches keep padding inside each batch small;
+    # rows are scattered back into the original order
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    embeddings = None
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        vectors = np.asarray(embed_fn([texts[i] for i in batch]), dtype='float32')
+        if embeddings is None:
+            embeddings = np.empty((len(texts), vectors.shape[1]), dtype='float32')
+        embeddings[batch] = vectors
+    return embeddings
+
+def content_hash(text: str) -> bytes:
+    data = text.encode('utf-8')
+    if blake3:
+        return blake3.blake3(data).digest(16)
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+class EmbeddingCache:
+    """
+    SQLite-backed map from chunk content hash to its float32 embedding.
+    Use one cache file per embedding model.
+    """
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS embeddings (hash BLOB PRIMARY KEY, vector BLOB NOT NULL)')
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        found = {}
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows = self.conn.execute(
+                f'SELECT hash, vector FROM embeddings WHERE hash IN ({",".join("?" * len(batch))})', batch
+            )
+            found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+        return found
+
+    def put_many(self, items):
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO embeddings VALUES (?, ?)',
+                ((key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items),
+            )
+
+    def close(self):
+        self.conn.close()
+
+def embed_unique(texts: List[str], embed_fn, cache: EmbeddingCache = None) -> np.ndarray:
+    # Identical chunks (overlapping or re-ingested documents) are embedded
+    # once; with a cache, chunks seen by an earlier build aren't embedded at all
+    keys = [content_hash(t) for t in texts]
+    unique = dict.fromkeys(keys)
+    cached = cache.get_many(list(unique)) if cache else {}
+    missing = [key for key in unique if key not in cached]
+    if len(missing) == len(keys):
+        # Nothing shared or cached: the embedded rows are already in order
+        fresh = embed_in_batches(texts, embed_fn)
+        if cache:
+            cache.put_many(zip(keys, fresh))
+        return fresh
+    if missing:
+        text_by_key = dict(zip(keys, texts))
+        fresh = embed_in_batches([text_by_key[key] for key in missing], embed_fn)
+        if cache:
+            cache.put_many(zip(missing, fresh))
+        cached.update(zip(missing, fresh))
+    return np.stack([cached[key] for key in keys]).astype(np.float32, copy=False)
+
+def binarize(embeddings: np.ndarray) -> np.ndarray:
+    # One sign bit per dimension, packed 8 per byte for IndexBinaryFlat
+    return np.packbits(embeddings > 0, axis=1)
+
+META_FIELDS = ('crop', 'district', 'source')
+
+def write_chunk_store(out_path: str, chunks: List[str], metas: List[Dict[str, Any]]):
+    # Chunk texts go into one UTF-8 blob indexed by an offsets array, and each
+    # meta field into an int32 code array over a shared vocab (-1 for None),
+    # so loading is a few memory maps instead of a JSON parse
+    encoded = [chunk.encode('utf-8') for chunk in chunks]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(out_path + '.offsets.npy', offsets)
+    with open(out_path + '.text.bin', 'wb') as f:
+        f.write(b''.join(encoded))
+    vocab = {}
+    for field in META_FIELDS:
+        codes = [-1 if m[field] is None else vocab.setdefault(m[field], len(vocab)) for m in metas]
+        np.save(f'{out_path}.meta_{field}.npy', np.array(codes, dtype=np.int32))
+    write_json(out_path + '.vocab.json', list(vocab))
+
+class ChunkTexts:
+    # Sequence view over text.bin; only the chunks actually read get decoded
+    def __init__(self, prefix: str):
+        self.offsets = np.load(prefix + '.offsets.npy', mmap_mode='r')
+        # An empty blob can't be memory-mapped
+        self.blob = np.memmap(prefix + '.text.bin', dtype=np.uint8, mode='r') if self.offsets[-1] else b''
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+class ChunkMetas:
+    # Sequence view over the meta code arrays, decoded into dicts on access
+    def __init__(self, prefix: str):
+        self.vocab = read_json(prefix + '.vocab.json')
+        self.columns = {field: np.load(f'{prefix}.meta_{field}.npy', mmap_mode='r') for field in META_FIELDS}
+
+    def __len__(self):
+        return len(self.columns[META_FIELDS[0]])
+
+    def __getitem__(self, i):
+        return {
+            field: None if column[i] < 0 else self.vocab[column[i]]
+            for field, column in self.columns.items()
+        }
+
+def build_faiss_index(docs: List[Dict[str, Any]], embed_fn, tokenizer, out_path: str, binary=False, cache_path: str = None):
     all_chunks = []
     metas = []
     for doc in docs:
@@ -31,26 +189,54 @@ def build_faiss_index(docs: List[Dict[str, Any]], embed_fn, tokenizer, out_path:
                 'district': doc.get('district'),
                 'source': doc.get('source'),
             })
-    embeddings = embed_fn(all_chunks)
-    dim = len(embeddings[0])
-    index = faiss.IndexFlatL2(dim)
-    index.add(np.array(embeddings).astype('float32'))
-    faiss.write_index(index, out_path + '.index')
-    with open(out_path + '.meta.json', 'w', encoding='utf-8') as f:
-        json.dump({'chunks': all_chunks, 'meta': metas}, f, ensure_ascii=False, indent=2)
+    if not all_chunks:
+        raise ValueError('No text to index')
+    cache = EmbeddingCache(cache_path) if cache_path else None
+    try:
+        embeddings = embed_unique(all_chunks, embed_fn, cache)
+    finally:
+        if cache:
+            cache.close()
+    if binary:
+        # Hamming search over sign bits (32x smaller than float32), re-ranked
+        # with the normalized vectors kept alongside as float16
+        faiss.normalize_L2(embeddings)
+        bits = binarize(embeddings)
+        index = faiss.IndexBinaryFlat(bits.shape[1] * 8)
+        index.add(bits)
+        faiss.write_index_binary(index, out_path + '.bindex')
+        np.save(out_path + '.rerank.npy', embeddings.astype(np.float16))
+    else:
+        faiss.write_index(build_cosine_index(embeddings), out_path + '.index')
+    write_chunk_store(out_path, all_chunks, metas)
 
 class AdvisoryRAG:
-    def __init__(self, index_path: str, meta_path: str, embed_fn):
-        self.index = faiss.read_index(index_path)
-        with open(meta_path, encoding='utf-8') as f:
-            meta = json.load(f)
-        self.chunks = meta['chunks']
-        self.metas = meta['meta']
+    def __init__(self, index_path: str, meta_path: str, embed_fn, rerank_path: str = None):
+        # meta_path is the chunk store prefix from build_faiss_index, or a
+        # legacy .meta.json file
+        # With rerank_path, index_path is a binary index written by build_faiss_index(binary=True)
+        if rerank_path:
+            self.index = faiss.read_index_binary(index_path)
+            self.rerank_vectors = np.load(rerank_path, mmap_mode='r')
+        else:
+            self.index = configure_search(faiss.read_index(index_path))
+            self.rerank_vectors = None
+        if meta_path.endswith('.json'):
+            meta = read_json(meta_path)
+            self.chunks = meta['chunks']
+            self.metas = meta['meta']
+        else:
+            self.chunks = ChunkTexts(meta_path)
+            self.metas = ChunkMetas(meta_path)
         self.embed_fn = embed_fn
 
     def query(self, text: str, k=5):
-        emb = np.array(self.embed_fn([text])).astype('float32')
-        D, I = self.index.search(emb, k)
+        emb = np.array(self.embed_fn([text]), dtype=np.float32)
+        faiss.normalize_L2(emb)
+        if self.rerank_vectors is not None:
+            D, I = self._binary_search(emb, k)
+        else:
+            D, I = self.index.search(emb, k)
         results = []
         for idx, score in zip(I[0], D[0]):
             if idx < 0 or idx >= len(self.chunks):
@@ -62,9 +248,22 @@ class AdvisoryRAG:
             })
         return results
 
+    def _binary_search(self, emb: np.ndarray, k: int, oversample=4):
+        # Shortlist k * oversample candidates by Hamming distance, then keep
+        # the top k by exact cosine similarity
+        _, candidates = self.index.search(binarize(emb), k * oversample)
+        candidates = candidates[0][candidates[0] >= 0]
+        # Only the shortlist is upcast; older float32 rerank files load as-is
+        scores = self.rerank_vectors[candidates].astype(np.float32) @ emb[0]
+        top = np.argsort(-scores)[:k]
+        return scores[top][None, :], candidates[top][None, :]
+
 # Example usage:
-# tokenizer = AutoTokenizer.from_pretrained('sentence-transformers/all-MiniLM-L6-v2')
+# tokenizer = AutoTokenizer.from_pretrained('sentence-transformers/all-MiniLM-L6-v2', use_fast=True)
 # def embed_fn(texts): ...
 # build_faiss_index(docs, embed_fn, tokenizer, 'advisory')
-# rag = AdvisoryRAG('advisory.index', 'advisory.meta.json', embed_fn)
+# rag = AdvisoryRAG('advisory.index', 'advisory', embed_fn)
 # print(rag.query('How to sow wheat?'))
+# For large corpora, a binary index with float re-ranking:
+# build_faiss_index(docs, embed_fn, tokenizer, 'advisory', binary=True)
+# rag = AdvisoryRAG('advisory.bindex', 'advisory', embed_fn, rerank_path='advisory.rerank.npy')
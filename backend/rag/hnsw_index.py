@@ -0,0 +1,30 @@
+"""
+Cosine HNSW index construction and search settings, shared by the index
+builders and the query paths. Only needs faiss and numpy.
+"""
+import faiss
+import numpy as np
+
+# HNSW graph parameters: neighbours per node, build-time and query-time beam widths
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+def build_cosine_index(embeddings: np.ndarray):
+    # Inner product over L2-normalized vectors is cosine similarity. An HNSW
+    # graph over fp16 scalar-quantized vectors gives sublinear search at half
+    # the float32 memory. Normalizes embeddings in place
+    faiss.normalize_L2(embeddings)
+    index = faiss.IndexHNSWSQ(
+        embeddings.shape[1], faiss.ScalarQuantizer.QT_fp16, HNSW_M, faiss.METRIC_INNER_PRODUCT
+    )
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.train(embeddings)
+    index.add(embeddings)
+    return index
+
+def configure_search(index):
+    # Query-time beam width; flat indexes built before the switch to HNSW are left as they are
+    if hasattr(index, 'hnsw'):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
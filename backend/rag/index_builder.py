@@ -3,45 +3,74 @@ import sys
 import argparse
 import json
 import glob
+import mmap
 import faiss
+import numpy as np
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from rag.hnsw_index import build_cosine_index
+from rag.openai_embedder import load_openai_embedder
 
 try:
     from sentence_transformers import SentenceTransformer
 except ImportError:
     SentenceTransformer = None
 try:
-    import openai
+    import orjson
 except ImportError:
-    openai = None
+    orjson = None
+try:
+    from rag.onnx_embedder import load_onnx_embedder
+except ImportError:
+    load_onnx_embedder = None
+
+def _map_file(path, parse):
+    # Parse straight from a read-only mmap instead of copying the file into a
+    # read buffer; empty files can't be mapped and give None
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return parse(mm)
+
+def _loads_buffer(mm):
+    if orjson:
+        with memoryview(mm) as view:
+            return orjson.loads(view)
+    return json.loads(mm[:])
+
+def _read_markdown(path):
+    text = _map_file(path, lambda mm: str(mm, 'utf-8')) or ''
+    return [{'text': text, 'source': os.path.basename(path)}]
+
+def _read_json(path):
+    items = _map_file(path, _loads_buffer)
+    if isinstance(items, list):
+        return [{'text': item.get('text', ''), 'source': os.path.basename(path)} for item in items]
+    elif isinstance(items, dict):
+        return [{'text': items.get('text', ''), 'source': os.path.basename(path)}]
+    return []
 
 def read_documents(data_dir):
-    docs = []
-    for path in glob.glob(os.path.join(data_dir, '*.md')):
-        with open(path, encoding='utf-8') as f:
-            docs.append({'text': f.read(), 'source': os.path.basename(path)})
-    for path in glob.glob(os.path.join(data_dir, '*.json')):
-        with open(path, encoding='utf-8') as f:
-            items = json.load(f)
-            if isinstance(items, list):
-                for item in items:
-                    docs.append({'text': item.get('text', ''), 'source': os.path.basename(path)})
-            elif isinstance(items, dict):
-                docs.append({'text': items.get('text', ''), 'source': os.path.basename(path)})
-    return docs
+    readers = [(path, _read_markdown) for path in glob.glob(os.path.join(data_dir, '*.md'))]
+    readers += [(path, _read_json) for path in glob.glob(os.path.join(data_dir, '*.json'))]
+    # File reads overlap across threads; map() keeps documents in file order
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+        results = pool.map(lambda reader: reader[1](reader[0]), readers)
+        return [doc for docs in results for doc in docs]
 
 def get_embedder():
     api_key = os.environ.get('OPENAI_API_KEY')
-    if api_key and openai:
-        def embed_openai(texts):
-            openai.api_key = api_key
-            resp = openai.Embedding.create(input=texts, model='text-embedding-ada-002')
-            return [d['embedding'] for d in resp['data']]
-        return embed_openai, 'openai'
-    elif SentenceTransformer:
+    openai_embed = load_openai_embedder(api_key) if api_key else None
+    if openai_embed is not None:
+        return openai_embed, 'openai'
+    onnx_embed = load_onnx_embedder() if load_onnx_embedder else None
+    if onnx_embed is not None:
+        return onnx_embed, 'onnx-int8'
+    if SentenceTransformer:
         model = SentenceTransformer('all-MiniLM-L6-v2')
         def embed_st(texts):
-            return model.encode(texts, show_progress_bar=True).tolist()
+            return model.encode(texts, batch_size=64, convert_to_numpy=True, show_progress_bar=True).astype(np.float32, copy=False)
         return embed_st, 'sentence-transformers'
     else:
         raise RuntimeError('No embedding provider available. Install sentence-transformers or set OPENAI_API_KEY.')
@@ -49,13 +78,16 @@ def get_embedder():
 def build_index(docs, embed_fn, out_dir):
     os.makedirs(out_dir, exist_ok=True)
     texts = [d['text'] for d in docs]
-    embeddings = embed_fn(texts)
-    dim = len(embeddings[0])
-    index = faiss.IndexFlatL2(dim)
-    index.add(np.array(embeddings).astype('float32'))
-    faiss.write_index(index, os.path.join(out_dir, 'advisory.index'))
-    with open(os.path.join(out_dir, 'advisory_meta.json'), 'w', encoding='utf-8') as f:
-        json.dump(docs, f, ensure_ascii=False, indent=2)
+    embeddings = np.asarray(embed_fn(texts), dtype='float32')
+    faiss.write_index(build_cosine_index(embeddings), os.path.join(out_dir, 'advisory.index'))
+    # Compact JSON: this file is parsed on every server start
+    meta_path = os.path.join(out_dir, 'advisory_meta.json')
+    if orjson:
+        with open(meta_path, 'wb') as f:
+            f.write(orjson.dumps(docs))
+    else:
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(docs, f, ensure_ascii=False, separators=(',', ':'))
 
 def main():
     parser = argparse.ArgumentParser()
@@ -72,5 +104,4 @@ def main():
     print(f'Index and metadata written to {args.out}')
 
 if __name__ == '__main__':
-    import numpy as np
     main()
@@ -0,0 +1,72 @@
+"""
+Int8-quantized ONNX Runtime embedder for all-MiniLM-L6-v2.
+
+One-time export (needs optimum[onnxruntime]):
+    python -m rag.onnx_embedder --out rag/onnx_model
+
+The query and index embedders use it when rag/onnx_model/model_int8.onnx exists.
+"""
+import argparse
+import numpy as np
+from pathlib import Path
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+try:
+    from transformers import AutoTokenizer
+except ImportError:
+    AutoTokenizer = None
+
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+DEFAULT_DIR = Path(__file__).parent / 'onnx_model'
+QUANTIZED_FILE = 'model_int8.onnx'
+# Same input limit as the SentenceTransformer model
+MAX_SEQ_LENGTH = 256
+
+def export_model(out_dir=DEFAULT_DIR):
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    out_dir = Path(out_dir)
+    ORTModelForFeatureExtraction.from_pretrained(MODEL_NAME, export=True).save_pretrained(out_dir)
+    AutoTokenizer.from_pretrained(MODEL_NAME).save_pretrained(out_dir)
+    quantize_dynamic(str(out_dir / 'model.onnx'), str(out_dir / QUANTIZED_FILE), weight_type=QuantType.QInt8)
+
+def load_onnx_embedder(model_dir=DEFAULT_DIR):
+    """
+    Return an embed function backed by the quantized model, or None when
+    onnxruntime or the exported model is not available
+    """
+    model_dir = Path(model_dir)
+    if ort is None or AutoTokenizer is None or not (model_dir / QUANTIZED_FILE).exists():
+        return None
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = ort.InferenceSession(
+        str(model_dir / QUANTIZED_FILE), options, providers=['CPUExecutionProvider']
+    )
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    input_names = {i.name for i in session.get_inputs()}
+
+    def embed_onnx(texts):
+        enc = tokenizer(texts, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors='np')
+        feeds = {name: enc[name].astype(np.int64) for name in input_names if name in enc}
+        hidden = session.run(None, feeds)[0]
+        # Mean pooling over real tokens, then L2 normalization, as the
+        # SentenceTransformer pipeline does
+        mask = enc['attention_mask'][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+    return embed_onnx
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', default=str(DEFAULT_DIR), help='Output dir for the ONNX model')
+    args = parser.parse_args()
+    export_model(args.out)
+    print(f'Quantized ONNX model written to {args.out}')
+
+if __name__ == '__main__':
+    main()
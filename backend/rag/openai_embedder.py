@@ -0,0 +1,45 @@
+"""
+OpenAI embeddings over the REST API, shared by the query and index builders.
+
+Uses one pooled requests session per embedder and sends at most 2048 inputs
+per request, the API limit.
+"""
+import numpy as np
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+EMBEDDINGS_URL = 'https://api.openai.com/v1/embeddings'
+MODEL_NAME = 'text-embedding-ada-002'
+MAX_INPUTS = 2048
+
+def load_openai_embedder(api_key, model=MODEL_NAME):
+    """
+    Return an embed function for the OpenAI embeddings API, or None when
+    requests is not installed
+    """
+    if requests is None:
+        return None
+    # One session per embedder, so keep-alive reuses the TLS connection across calls
+    session = requests.Session()
+    session.headers['Authorization'] = f'Bearer {api_key}'
+
+    def embed_openai(texts):
+        out = None
+        for start in range(0, len(texts), MAX_INPUTS):
+            resp = session.post(
+                EMBEDDINGS_URL,
+                json={'input': texts[start:start + MAX_INPUTS], 'model': model},
+                timeout=30,
+            )
+            resp.raise_for_status()
+            data = resp.json()['data']
+            # Rows go straight into a float32 buffer, with no float64 intermediate
+            if out is None:
+                out = np.empty((len(texts), len(data[0]['embedding'])), dtype=np.float32)
+            for d in data:
+                out[start + d['index']] = d['embedding']
+        return out
+    return embed_openai
@@ -1,8 +1,15 @@
 import os
 import json
+import queue
+import threading
+import time
 import numpy as np
 import faiss
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from functools import lru_cache
 from pathlib import Path
+from rag.hnsw_index import configure_search
+from rag.openai_embedder import load_openai_embedder
 
 try:
     from sentence_transformers import SentenceTransformer
@@ -12,33 +19,149 @@ try:
     import openai
 except ImportError:
     openai = None
+try:
+    from rag.onnx_embedder import load_onnx_embedder
+except ImportError:
+    load_onnx_embedder = None
 try:
     from transformers import pipeline
 except ImportError:
     pipeline = None
+try:
+    import torch
+except ImportError:
+    torch = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Numeric kernels are compiled when numba is installed and run as plain Python otherwise
+jit = numba.njit(cache=True) if numba else (lambda f: f)
 
+if torch is not None:
+    # Inference only: use every core for the embedding forward pass
+    torch.set_num_threads(os.cpu_count() or 1)
+
+# Index, embedder and LLM are loaded once per process; restart to pick up a rebuilt index
+@lru_cache(maxsize=4)
 def load_index(index_dir):
-    index = faiss.read_index(str(Path(index_dir) / 'advisory.index'))
-    with open(Path(index_dir) / 'advisory_meta.json', encoding='utf-8') as f:
-        meta = json.load(f)
+    index = configure_search(faiss.read_index(str(Path(index_dir) / 'advisory.index')))
+    meta_path = Path(index_dir) / 'advisory_meta.json'
+    if orjson:
+        meta = orjson.loads(meta_path.read_bytes())
+    else:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
     return index, meta
 
+@lru_cache(maxsize=4)
+def load_source_ids(index_dir):
+    # Integer code per indexed document's source, so the scoring kernels never touch the dicts
+    codes = {}
+    _, meta = load_index(index_dir)
+    return np.array([codes.setdefault(m.get('source', ''), len(codes)) for m in meta], dtype=np.int64)
+
+class QueryBatcher:
+    """
+    Coalesce concurrent single-vector searches into one index.search call.
+    Requests arriving within `window` seconds of the first are searched together.
+    A caller waits at most `timeout` seconds, so a stalled worker can't hang requests.
+    """
+    # The OpenAI embeddings request timeout (30s) plus a margin
+    TIMEOUT = 35
+
+    def __init__(self, index, max_batch=64, window=0.005, timeout=TIMEOUT):
+        self.index = index
+        self.max_batch = max_batch
+        self.window = window
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name='faiss-batcher', daemon=True).start()
+
+    def search(self, vector, k):
+        # Returns (distances, ids) for one query vector, like a row of index.search
+        future = Future()
+        self._queue.put((vector, k, future))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise TimeoutError(f'RAG search not answered within {self.timeout}s') from None
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._search_batch(batch)
+
+    def _search_batch(self, batch):
+        k = max(item[1] for item in batch)
+        try:
+            D, I = self.index.search(np.stack([item[0] for item in batch]).astype(np.float32, copy=False), k)
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for row, (_, k_row, future) in enumerate(batch):
+            future.set_result((D[row, :k_row], I[row, :k_row]))
+
+class EmbedSearchBatcher(QueryBatcher):
+    """
+    QueryBatcher fed with query texts: each batch costs one embed_fn call
+    and one index.search call, so concurrent requests share the forward pass.
+    """
+    def __init__(self, index, embed_fn, max_batch=32, window=0.01, timeout=QueryBatcher.TIMEOUT):
+        self.embed_fn = embed_fn
+        self.cosine = index.metric_type == faiss.METRIC_INNER_PRODUCT
+        super().__init__(index, max_batch, window, timeout)
+
+    def _search_batch(self, batch):
+        try:
+            emb = np.asarray(self.embed_fn([item[0] for item in batch]), dtype=np.float32)
+            if self.cosine:
+                faiss.normalize_L2(emb)
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        super()._search_batch([(vector, k, future) for vector, (_, k, future) in zip(emb, batch)])
+
+@lru_cache(maxsize=4)
+def get_batcher(index_dir):
+    # One worker thread per index, sharing the process-wide embedder
+    return EmbedSearchBatcher(load_index(index_dir)[0], get_embedder()[0])
+
+@lru_cache(maxsize=1)
 def get_embedder():
     api_key = os.environ.get('OPENAI_API_KEY')
-    if api_key and openai:
-        def embed_openai(texts):
-            openai.api_key = api_key
-            resp = openai.Embedding.create(input=texts, model='text-embedding-ada-002')
-            return np.array([d['embedding'] for d in resp['data']]).astype('float32')
-        return embed_openai, 'openai'
-    elif SentenceTransformer:
+    openai_embed = load_openai_embedder(api_key) if api_key else None
+    if openai_embed is not None:
+        return openai_embed, 'openai'
+    onnx_embed = load_onnx_embedder() if load_onnx_embedder else None
+    if onnx_embed is not None:
+        return onnx_embed, 'onnx-int8'
+    if SentenceTransformer:
         model = SentenceTransformer('all-MiniLM-L6-v2')
+        model.eval()
         def embed_st(texts):
-            return model.encode(texts, show_progress_bar=False)
+            return model.encode(texts, batch_size=64, convert_to_numpy=True, show_progress_bar=False).astype(np.float32, copy=False)
         return embed_st, 'sentence-transformers'
     else:
         raise RuntimeError('No embedding provider available.')
 
+@lru_cache(maxsize=1)
 def get_llm():
     api_key = os.environ.get('OPENAI_API_KEY')
     if api_key and openai:
@@ -59,37 +182,125 @@ def get_llm():
     else:
         raise RuntimeError('No LLM provider available.')
 
-def compute_confidence(scores, sources):
-    if len(scores) == 0:
-        return 'Low'
-    high = all(s > 0.7 for s in scores[:2])
-    agree = len(set(sources[:2])) == 1 if len(sources) > 1 else True
+_CONFIDENCE_LABELS = ('Low', 'Medium', 'High')
+# High/Medium thresholds on the 1 / (1 + d) scale of squared-L2 indexes
+HIGH_THRESHOLD = 0.7
+MEDIUM_THRESHOLD = 0.5
+# The same boundary for cosine scores of unit vectors, where d = 2 - 2 cos:
+# 1 / (1 + d) > 0.7 <=> cos > 11/14 (~0.786). The 0.5 boundary maps to cos > 0.5
+COSINE_HIGH_THRESHOLD = 11 / 14
+
+@jit
+def _confidence_code(scores, source_ids, high_threshold, medium_threshold):
+    n = scores.shape[0]
+    if n == 0:
+        return 0
+    high = True
+    for i in range(min(2, n)):
+        if not scores[i] > high_threshold:
+            high = False
+    m = source_ids.shape[0]
+    agree = source_ids[0] == source_ids[1] if m > 1 else True
     if high and agree:
-        return 'High'
-    elif any(s > 0.5 for s in scores) and len(set(sources)) <= 2:
-        return 'Medium'
-    return 'Low'
+        return 2
+    any_medium = False
+    for i in range(n):
+        if scores[i] > medium_threshold:
+            any_medium = True
+    distinct = 0
+    for i in range(m):
+        seen = False
+        for j in range(i):
+            if source_ids[j] == source_ids[i]:
+                seen = True
+                break
+        if not seen:
+            distinct += 1
+    if any_medium and distinct <= 2:
+        return 1
+    return 0
+
+def compute_confidence(scores, sources, high_threshold=HIGH_THRESHOLD, medium_threshold=MEDIUM_THRESHOLD):
+    # sources may be labels or an int array of source ids
+    scores = np.asarray(scores, dtype=np.float64)
+    if not isinstance(sources, np.ndarray):
+        codes = {}
+        sources = np.array([codes.setdefault(s, len(codes)) for s in sources], dtype=np.int64)
+    return _CONFIDENCE_LABELS[_confidence_code(scores, sources, high_threshold, medium_threshold)]
+
+def compute_confidence_batch(scores, source_ids, high_threshold=HIGH_THRESHOLD, medium_threshold=MEDIUM_THRESHOLD):
+    """
+    compute_confidence for N queries at once: scores and source_ids are
+    (N, k) arrays, scored with whole-array comparisons instead of a loop
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    source_ids = np.asarray(source_ids)
+    if scores.shape[1] == 0:
+        return ['Low'] * scores.shape[0]
+    high = (scores[:, :2] > high_threshold).all(axis=1)
+    if source_ids.shape[1] > 1:
+        high &= source_ids[:, 0] == source_ids[:, 1]
+    # Distinct sources per row: 1 + number of changes along the sorted row
+    distinct = 1 + (np.diff(np.sort(source_ids, axis=1), axis=1) != 0).sum(axis=1)
+    medium = (scores > medium_threshold).any(axis=1) & (distinct <= 2)
+    codes = np.where(high, 2, np.where(medium, 1, 0))
+    return [_CONFIDENCE_LABELS[c] for c in codes]
+
+@jit
+def _gather_hits(distances, ids, n_docs, cosine):
+    # Drop FAISS's -1 padding and out-of-range ids; score the rest
+    hits = np.empty(ids.shape[0], dtype=np.int64)
+    scores = np.empty(ids.shape[0], dtype=np.float64)
+    n = 0
+    for j in range(ids.shape[0]):
+        i = ids[j]
+        if i < 0 or i >= n_docs:
+            continue
+        hits[n] = i
+        scores[n] = distances[j] if cosine else 1.0 / (1.0 + distances[j])
+        n += 1
+    return hits[:n], scores[:n]
+
+def retrieve(text, index_dir, k=3):
+    """
+    Embed, search and score one query; returns the hit document ids and the confidence label
+    """
+    _, meta = load_index(index_dir)
+    # Concurrent requests share one embedding call and one FAISS search through the batcher
+    batcher = get_batcher(index_dir)
+    distances, ids = batcher.search(text, k)
+    # Cosine indexes score by similarity; indexes built before the switch to
+    # cosine still hold L2 distances and are scored 1 / (1 + d)
+    hits, scores = _gather_hits(distances, ids, len(meta), batcher.cosine)
+    high_threshold = COSINE_HIGH_THRESHOLD if batcher.cosine else HIGH_THRESHOLD
+    return hits, compute_confidence(scores, load_source_ids(index_dir)[hits], high_threshold)
+
+def warmup(index_dir):
+    """
+    Load the index, start the batcher and compile the scoring kernels, all
+    without an embedding call (which may be a billed network request)
+    """
+    get_batcher(index_dir)
+    load_source_ids(index_dir)
+    # Dummy arrays with the same dtypes retrieve() passes
+    hits, scores = _gather_hits(np.zeros(1, dtype=np.float32), np.zeros(1, dtype=np.int64), 1, True)
+    compute_confidence(scores, hits, COSINE_HIGH_THRESHOLD)
 
 def query_rag(user_query, index_dir, k=3):
-    index, meta = load_index(index_dir)
-    embed_fn, _ = get_embedder()
-    emb = embed_fn([user_query['text']])
-    D, I = index.search(emb, k)
-    top_snippets = [meta[i] for i in I[0] if i < len(meta)]
-    scores = [1 / (1 + float(d)) for d in D[0]]
-    sources = [s.get('source', '') for s in top_snippets]
+    _, meta = load_index(index_dir)
+    hits, confidence = retrieve(user_query['text'], index_dir, k)
+    top_snippets = [meta[i] for i in hits]
     context = '\n'.join([s['text'] for s in top_snippets])
     llm, _ = get_llm()
     prompt = f"Context: {context}\n\nQuestion: {user_query['text']}\nAnswer in {user_query.get('language','en')}."
     answer = llm(prompt)
-    confidence = compute_confidence(scores, sources)
     safety_alternatives = []
     if confidence == 'Low':
         safety_alternatives.append('Consult a local expert or extension officer for confirmation.')
     return {
         'answer': answer.strip(),
         'confidence': confidence,
-        'sources': [{'title': s.get('source',''), 'doc_id': i} for i, s in zip(I[0], top_snippets)],
+        'sources': [{'title': s.get('source',''), 'doc_id': int(i)} for i, s in zip(hits, top_snippets)],
         'safety_alternatives': safety_alternatives
     }
 
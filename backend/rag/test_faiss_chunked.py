@@ -0,0 +1,50 @@
+import re
+from rag.faiss_chunked import chunk_text
+
+class WordTokenizer:
+    # Fast-tokenizer stand-in: one token per whitespace-separated word
+    def __call__(self, text, return_offsets_mapping=True, add_special_tokens=False):
+        return {'offset_mapping': [m.span() for m in re.finditer(r'\S+', text)]}
+
+def _words(n):
+    return [f'w{i}' for i in range(n)]
+
+def _chunks(n, **kwargs):
+    return chunk_text(' '.join(_words(n)), WordTokenizer(), **kwargs)
+
+def _expected(n, token_spans):
+    words = _words(n)
+    return [' '.join(words[start:end]) for start, end in token_spans]
+
+# max_tokens=10, overlap=2: windows start every 8 tokens
+WINDOW = dict(max_tokens=10, overlap=2, min_tokens=4)
+
+def test_chunk_short_text():
+    assert _chunks(0, **WINDOW) == []
+    assert _chunks(7, **WINDOW) == _expected(7, [(0, 7)])
+    assert _chunks(10, **WINDOW) == _expected(10, [(0, 10)])
+
+def test_chunk_exact_multiple_of_step():
+    # 26 = 10 + 2 * 8: three full windows and no tail
+    assert _chunks(26, **WINDOW) == _expected(26, [(0, 10), (8, 18), (16, 26)])
+
+def test_chunk_tail_kept_at_min_tokens():
+    # The last window holds exactly min_tokens tokens, so it stays as is
+    assert _chunks(20, **WINDOW) == _expected(20, [(0, 10), (8, 18), (16, 20)])
+
+def test_chunk_short_tail_folded():
+    # A 3-token tail is folded into a full-size last window ending at the text end
+    assert _chunks(19, **WINDOW) == _expected(19, [(0, 10), (8, 18), (9, 19)])
+
+def test_chunk_spans_keep_original_text():
+    text = 'rice  wheat\nmillet,  maize'
+    assert chunk_text(text, WordTokenizer(), max_tokens=2, overlap=1, min_tokens=1) == [
+        'rice  wheat', 'wheat\nmillet,', 'millet,  maize'
+    ]
+
+if __name__ == '__main__':
+    test_chunk_short_text()
+    test_chunk_exact_multiple_of_step()
+    test_chunk_tail_kept_at_min_tokens()
+    test_chunk_short_tail_folded()
+    test_chunk_spans_keep_original_text()
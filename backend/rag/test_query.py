@@ -1,4 +1,8 @@
-from rag.query import compute_confidence
+import threading
+import time
+import faiss
+import numpy as np
+from rag.query import compute_confidence, compute_confidence_batch, COSINE_HIGH_THRESHOLD, EmbedSearchBatcher
 
 def test_confidence():
     assert compute_confidence([0.8, 0.75], ['a','a']) == 'High'
@@ -7,5 +11,85 @@ def test_confidence():
     assert compute_confidence([], []) == 'Low'
     print('All confidence scoring tests passed.')
 
+def test_confidence_source_ids():
+    assert compute_confidence(np.array([0.8, 0.75]), np.array([3, 3])) == 'High'
+    assert compute_confidence(np.array([0.8, 0.75]), np.array([3, 4])) == 'Medium'
+    assert compute_confidence(np.array([0.6]), np.array([], dtype=np.int64)) == 'Medium'
+
+def test_confidence_batch():
+    scores = np.array([[0.8, 0.75, 0.1], [0.8, 0.75, 0.1], [0.6, 0.4, 0.3], [0.6, 0.4, 0.3], [0.3, 0.2, 0.1]])
+    ids = np.array([[1, 1, 2], [1, 2, 2], [1, 2, 2], [1, 2, 3], [1, 2, 2]])
+    expected = [compute_confidence(s, i) for s, i in zip(scores, ids)]
+    assert compute_confidence_batch(scores, ids) == expected == ['High', 'Medium', 'Medium', 'Low', 'Low']
+
+def test_confidence_cosine_threshold():
+    # cos > 11/14 is the old 1 / (1 + d) > 0.7 boundary for unit vectors
+    assert compute_confidence([0.78, 0.78], ['a', 'a'], COSINE_HIGH_THRESHOLD) == 'Medium'
+    assert compute_confidence([0.79, 0.79], ['a', 'a'], COSINE_HIGH_THRESHOLD) == 'High'
+    scores = np.array([[0.78, 0.78], [0.79, 0.79]])
+    ids = np.array([[1, 1], [1, 1]])
+    assert compute_confidence_batch(scores, ids, COSINE_HIGH_THRESHOLD) == ['Medium', 'High']
+
+def _one_hot_batcher(embed_calls, fail_on=None, delay=0, **kwargs):
+    # Document i is the i-th unit vector and query text 'i' embeds to it
+    dim = 8
+    index = faiss.IndexFlatIP(dim)
+    index.add(np.eye(dim, dtype=np.float32))
+    def embed_fn(texts):
+        embed_calls.append(list(texts))
+        time.sleep(delay)
+        if fail_on in texts:
+            raise ValueError('embedding failed')
+        return np.eye(dim, dtype=np.float32)[[int(t) for t in texts]]
+    return EmbedSearchBatcher(index, embed_fn, **kwargs)
+
+def _search_concurrently(batcher, queries):
+    results = [None] * len(queries)
+    def run(i, text, k):
+        try:
+            results[i] = batcher.search(text, k)
+        except Exception as e:
+            results[i] = e
+    threads = [threading.Thread(target=run, args=(i, text, k)) for i, (text, k) in enumerate(queries)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+def test_batcher_rows_and_k():
+    embed_calls = []
+    batcher = _one_hot_batcher(embed_calls, window=0.2)
+    queries = [(str(i), 1 + i % 3) for i in range(6)]
+    results = _search_concurrently(batcher, queries)
+    # All six searches shared one embedding call
+    assert len(embed_calls) == 1
+    for (text, k), (distances, ids) in zip(queries, results):
+        assert len(ids) == len(distances) == k
+        assert ids[0] == int(text)
+        assert distances[0] > 0.99
+
+def test_batcher_exception_reaches_every_caller():
+    embed_calls = []
+    batcher = _one_hot_batcher(embed_calls, fail_on='3', window=0.2)
+    results = _search_concurrently(batcher, [(str(i), 2) for i in range(5)])
+    assert len(embed_calls) == 1
+    assert all(isinstance(r, ValueError) for r in results)
+
+def test_batcher_timeout():
+    batcher = _one_hot_batcher([], delay=0.5, timeout=0.05)
+    try:
+        batcher.search('1', 1)
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError('expected a timeout')
+
 if __name__ == '__main__':
     test_confidence()
+    test_confidence_source_ids()
+    test_confidence_batch()
+    test_confidence_cosine_threshold()
+    test_batcher_rows_and_k()
+    test_batcher_exception_reaches_every_caller()
+    test_batcher_timeout()
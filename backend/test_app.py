@@ -0,0 +1,44 @@
+import app as backend
+
+def test_compressed_etag_revalidation(monkeypatch):
+    # Force compression so the served ETag carries flask-compress's ":gzip" suffix
+    monkeypatch.setitem(backend.app.config, 'COMPRESS_MIN_SIZE', 0)
+    calls = []
+    over_rate_limit = backend.over_rate_limit
+    monkeypatch.setattr(backend, 'over_rate_limit', lambda *a, **kw: calls.append(1) or over_rate_limit(*a, **kw))
+    client = backend.app.test_client()
+    url = '/advisories?district=Kanpur&crop=wheat'
+    first = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    if backend.Compress:
+        assert etag.endswith(':gzip"')
+    for _ in range(40):
+        resp = client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert resp.status_code == 304
+    # Only the first request reached the rate limiter
+    assert len(calls) == 1
+
+def test_trivial_question_gets_sample_response():
+    client = backend.app.test_client()
+    resp = client.post('/advice', json={'question': '1234'})
+    assert resp.status_code == 200
+    assert resp.get_json()['provider'] == 'sample'
+
+def test_repeated_question_served_from_recent_answers(monkeypatch):
+    calls = []
+    def handler(session, question):
+        calls.append(question)
+        return 'Sow wheat in November.', {'level': 'High', 'score': 80, 'factors': []}
+    monkeypatch.setenv('GEMINI_API_KEY', 'test-key')
+    monkeypatch.setattr(backend, '_GEMINI_SESSION', object())
+    monkeypatch.setattr(backend, '_GEMINI_HANDLERS', {'english': handler})
+    monkeypatch.setattr(backend, '_recent_answers', backend.OrderedDict())
+    client = backend.app.test_client()
+    body = {'question': 'When should I sow wheat?', 'language': 'english'}
+    first = client.post('/advice', json=body).get_json()
+    second = client.post('/advice', json=body).get_json()
+    assert first['provider'] == 'gemini-pro'
+    assert second == first
+    # The repeat within DUPLICATE_WINDOW never reached the handler
+    assert calls == ['When should I sow wheat?']
@@ -0,0 +1,24 @@
+import csv
+import pytest
+import loaders
+
+CSV_CASES = {
+    'plain': 'crop,price\nधान,12\nwheat,007\n',
+    'quoted': 'a,b,c\n1,"",x\n2,3.5,"q,r"\n"multi\nline",,\n',
+    'empty_cells': 'a,b,c\n,,\n1,,3\n',
+    'blank_lines': 'a,b\r\n1,2\r\n\r\n3,4\r\n\n',
+    'short_row': 'a,b,c\n1,2\n',
+    'extra_fields': 'a,b\n1,2,3\n',
+    'bom_header': '﻿a,b\n1,2\n',
+    'duplicate_header': 'a,a\n1,2\n',
+    'header_only': 'a,b\n',
+    'empty_file': '',
+}
+
+@pytest.mark.parametrize('name', sorted(CSV_CASES))
+def test_load_csv_matches_dictreader(tmp_path, name):
+    path = tmp_path / 'data.csv'
+    path.write_text(CSV_CASES[name], encoding='utf-8', newline='')
+    with open(path, encoding='utf-8') as f:
+        expected = list(csv.DictReader(f))
+    assert loaders.load_csv(str(path)) == expected